@@ -0,0 +1,143 @@
+"""
+Event loop stalls caused by logging from coroutines: L (handlers write in the loop thread) vs AsyncL
+(records are enqueued, the writer thread does the I/O).
+
+Each run starts <tasks> tasks logging <records> records each to a log file, while a ticker coroutine
+measures how late the loop wakes it up every millisecond. Every 1000-th write of the file handler stalls
+for <stall> ms (slow disk, midnight rollover). After `await log.aclose()` all the records must be in the file,
+each with its coroutine and task in the prefix.
+
+    python benchmarks/bench_async.py --tasks 10000 --records 5 --stall 50
+
+pytest:
+    pytest benchmarks/bench_async.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark.aio import AsyncL  # noqa: E402
+from pyquark.helper import L  # noqa: E402
+
+
+async def ticker(lags, stop, interval=0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def worker(log, records):
+    for index in range(records):
+        log.print(f"record {index}")
+        await asyncio.sleep(0)
+
+
+def slow_file_writes(log, stall, every=1000):
+    """Makes every <every>-th record of the file handler stall for <stall> seconds"""
+    handler = log._handlers()[1]
+    handler = getattr(handler, 'target', handler)
+    emit = handler.emit
+    count = 0
+
+    def slow_emit(record):
+        nonlocal count
+        count += 1
+        if not count % every:
+            time.sleep(stall)
+        emit(record)
+
+    handler.emit = slow_emit
+
+
+async def run_case(factory, tasks, records, log_dir, stall=0.0):
+    log = factory(log_dir)
+    if stall:
+        slow_file_writes(log, stall)
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(log, records) for _ in range(tasks)))
+    logged = time.perf_counter() - start
+    stop.set()
+    await tick
+    if isinstance(log, AsyncL):
+        await log.aclose()
+    else:
+        log.flush()
+    written = time.perf_counter() - start
+    with open(log.log_file_name) as log_file:
+        lines = log_file.read().splitlines()
+    lags.sort()
+    return {
+        'logged_s': logged,
+        'written_s': written,
+        'lines': len(lines),
+        'max_lag_ms': lags[-1] * 1000 if lags else 0.0,
+        'p99_lag_ms': lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+        'sample': lines[-1] if lines else '',
+    }
+
+
+def run(tasks, records, stall=0.0):
+    cases = {
+        'L': lambda log_dir: L(application='bench.async.sync', log_to_file=True, log_to_console=False,
+                               log_dir=log_dir, init=True),
+        'AsyncL': lambda log_dir: AsyncL(application='bench.async.aio', log_to_file=True, log_to_console=False,
+                                         log_dir=log_dir, init=True),
+    }
+    results = {}
+    for name, factory in cases.items():
+        with tempfile.TemporaryDirectory() as log_dir:
+            results[name] = asyncio.run(run_case(factory, tasks, records, log_dir, stall))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--records', type=int, default=5, help='records per task')
+    parser.add_argument('--stall', type=float, default=50, help='ms: stall of every 1000-th file write')
+    args = parser.parse_args()
+    print("{:<8} {:>10} {:>10} {:>10} {:>12} {:>12}".format('logger', 'logged, s', 'written, s', 'lines',
+                                                            'p99 lag, ms', 'max lag, ms'))
+    for name, result in run(args.tasks, args.records, args.stall / 1000).items():
+        print("{:<8} {logged_s:>10.2f} {written_s:>10.2f} {lines:>10} {p99_lag_ms:>12.2f} "
+              "{max_lag_ms:>12.2f}".format(name, **result))
+    print(f"Sample: {result['sample']}")
+
+
+def test_async_records_are_written_with_task_prefix():
+    tasks, records = 2000, 3
+    with tempfile.TemporaryDirectory() as log_dir:
+        result = asyncio.run(run_case(
+            lambda path: AsyncL(application='bench.async.test', log_to_file=True, log_to_console=False,
+                                log_dir=path, init=True), tasks, records, log_dir))
+    assert result['lines'] == tasks * records
+    assert '[worker@Task-' in result['sample'], result['sample']
+
+
+
+def test_async_logger_never_uses_synchronous_handlers():
+    from pyquark.handlers import BackgroundHandler
+    L()  # Default L logger with its synchronous console handler
+    assert all(isinstance(handler, BackgroundHandler) for handler in AsyncL().logger.handlers)
+    with tempfile.TemporaryDirectory() as log_dir:
+        shared = L(application='bench.async.shared', log_to_file=True, log_to_console=False, log_dir=log_dir)
+        log = AsyncL(application='bench.async.shared', log_to_console=False)
+        assert [type(handler) for handler in log.logger.handlers] == [BackgroundHandler]
+        shared.print("sync")
+        log.print("async")
+        asyncio.run(log.aclose())
+        with open(shared.log_file_name) as log_file:
+            assert len(log_file.read().splitlines()) == 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Logging through the LogCollector aggregator process vs writing the log file in the process: time per record
+on the logging side and until the records are in the file.
+
+    python benchmarks/bench_collector.py --records 50000
+
+pytest (spawns an aggregator):
+    pytest benchmarks/bench_collector.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark.collector import LogCollector  # noqa: E402
+from pyquark.helper import L  # noqa: E402
+
+
+def read_lines(log_dir, name):
+    with open(os.path.join(log_dir, f'{name}.log')) as log_file:
+        return log_file.read().splitlines()
+
+
+def run_case(name, records, log_dir, collector=None):
+    log = L(application=name, log_to_file=True, log_to_console=False, log_dir=log_dir, collector=collector)
+    start = time.perf_counter()
+    for index in range(records):
+        log.gprint(f"record {index}")
+    logged = time.perf_counter() - start
+    log.flush()
+    if collector is not None:
+        collector.stop()
+    written = time.perf_counter() - start
+    return {'logged_us': logged / records * 1e6, 'written_s': written, 'lines': len(read_lines(log_dir, name))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=50000)
+    args = parser.parse_args()
+    print("{:<10} {:>14} {:>12} {:>10}".format('case', 'logged, us/rec', 'written, s', 'lines'))
+    with tempfile.TemporaryDirectory() as log_dir:
+        rows = [('file', run_case('bench.collector.file', args.records, log_dir))]
+        collector = LogCollector(log_dir=log_dir).start()
+        rows.append(('collector', run_case('bench.collector.sent', args.records, log_dir, collector)))
+    for name, row in rows:
+        print("{:<10} {logged_us:>14.2f} {written_s:>12.2f} {lines:>10}".format(name, **row))
+
+
+def test_unpicklable_record_values_do_not_drop_the_batch():
+    with tempfile.TemporaryDirectory() as log_dir:
+        collector = LogCollector(log_dir=log_dir, flush_interval=0.05).start()
+        try:
+            log = L(application='bench.collector.test', log_to_file=True, log_to_console=False,
+                    log_dir=log_dir, collector=collector)
+            handler = log.logger.handlers[-1]
+            handler = getattr(handler, 'target', handler)
+            handler.flush_interval = 0.05
+            for index in range(3):
+                log.gprint(f"before {index}")
+            log.gprint("lock", handle=threading.Lock())
+            for index in range(3):
+                log.gprint(f"after {index}")
+            time.sleep(0.5)  # Sent by the periodic flush, not by an explicit flush
+            log.gprint("later")
+            time.sleep(0.5)
+        finally:
+            collector.stop()
+        lines = read_lines(log_dir, 'bench.collector.test')
+    messages = [line.rsplit(']  ', 1)[-1] for line in lines]
+    assert messages[:7] == ['before 0', 'before 1', 'before 2', 'lock', 'after 0', 'after 1', 'after 2'], lines
+    assert messages[-1] == 'later', lines
+
+
+if __name__ == "__main__":
+    main()
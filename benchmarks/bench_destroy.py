@@ -0,0 +1,72 @@
+"""
+Cost of utils.__destroy__ on a large holder: <zones> zones with nested dicts of mask buffers, shared
+and cyclic references. Prints the time and the report (visited objects, bytes, buffer bytes).
+
+    python benchmarks/bench_destroy.py --zones 10000
+
+pytest:
+    pytest benchmarks/bench_destroy.py
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark import utils  # noqa: E402
+
+Point = collections.namedtuple('Point', 'x y')
+
+
+class Holder(object):
+    __init__ = utils.__init__
+    __destroy__ = utils.__destroy__
+
+
+def make_holder(zones):
+    holder = Holder('bench')
+    shared = bytearray(1024)
+    for index in range(zones):
+        mask = memoryview(bytearray(256))
+        holder.masks[index] = {'mask': mask, 'shared': shared, 'origin': Point(index, index)}
+        holder.zones.append(holder.masks[index])
+    holder.zones.append(holder)  # Cycle
+    return holder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--zones', type=int, default=10000)
+    args = parser.parse_args()
+    for hard_destroy in (False, True):
+        holder = make_holder(args.zones)
+        start = time.perf_counter()
+        report = holder.__destroy__(hard_destroy=hard_destroy, collect=True)
+        elapsed = time.perf_counter() - start
+        print(f"hard_destroy={hard_destroy!s:<5} {elapsed * 1000:>9.1f} ms  objects={report['objects']} "
+              f"bytes={report['bytes']} buffer_bytes={report['buffer_bytes']}")
+
+
+def test_report_counts_objects_in_both_modes():
+    report = make_holder(10).__destroy__()
+    assert report['objects'] > 10 and report['bytes'] > 0 and report['buffer_bytes'] == 10 * 256
+    holder = make_holder(10)
+    report = holder.__destroy__(hard_destroy=True)
+    assert report['objects'] == len(['name', 'zones', 'damage_size', 'is_damaged', 'masks', 'damage_masks',
+                                     '_numpy_arrays', '_custom_objects'])
+    assert report['bytes'] > 0 and not vars(holder)
+
+
+def test_containers_held_by_the_caller_are_left_intact():
+    caller_list, caller_set = [1, 2, 3], {1, 2}
+    holder = Holder('bench')
+    holder.zones, holder.tags, holder.origin = caller_list, caller_set, Point(1, 2)
+    holder.__destroy__()
+    assert caller_list == [1, 2, 3] and caller_set == {1, 2}
+    assert holder.zones == [] and holder.origin == () and holder.tags is None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+start_as_thread on the shared bounded executor vs a new threading.Thread per call: time to start and finish
+<number> short tasks, and the number of threads alive at the peak.
+
+    python benchmarks/bench_executors.py --number 20000 --max-workers 8 --max-queue 1000
+
+pytest:
+    pytest benchmarks/bench_executors.py
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark.executors import get_executor  # noqa: E402
+from pyquark.helper import L, start_as_thread  # noqa: E402
+
+
+QUIET = L(application='bench.executors', log_to_console=False)
+
+
+def task(values, value):
+    values.append(value)
+
+
+def run_threads(number):
+    values, threads, peak = [], [], 0
+    start = time.perf_counter()
+    for index in range(number):
+        thread = threading.Thread(target=task, args=(values, index))
+        thread.start()
+        threads.append(thread)
+        peak = max(peak, threading.active_count())
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, peak, len(values)
+
+
+def run_executor(number, max_workers, max_queue):
+    pooled = start_as_thread(task, executor='bench', max_workers=max_workers, max_queue=max_queue,
+                             logger=QUIET)
+    values, futures, peak = [], [], 0
+    start = time.perf_counter()
+    for index in range(number):
+        futures.append(pooled(values, index))
+        peak = max(peak, threading.active_count())
+    for future in futures:
+        future.result()
+    return time.perf_counter() - start, peak, len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--max-queue', type=int, default=1000)
+    args = parser.parse_args()
+    print("{:<16} {:>10} {:>14} {:>10}".format('case', 'total, s', 'peak threads', 'tasks'))
+    for name, result in (('Thread per call', run_threads(args.number)),
+                         ('start_as_thread', run_executor(args.number, args.max_workers, args.max_queue))):
+        print("{:<16} {:>10.2f} {:>14} {:>10}".format(name, *result))
+
+
+@start_as_thread(executor='bench.test', max_workers=1, max_queue=1, logger=QUIET)
+def fetch(url, timeout=10, block=True):
+    return url, timeout, block
+
+
+def test_function_keyword_arguments_are_not_executor_options():
+    assert fetch('x', timeout=3).result() == ('x', 3, True)
+    assert fetch('x', block=False).result() == ('x', 10, False)
+    executor = get_executor('bench.test')
+    assert executor.submit(fetch.__wrapped__, 'y', timeout=0).result() == ('y', 0, True)
+    assert executor.submit_within(1, fetch.__wrapped__, 'z', block=False).result() == ('z', 10, False)
+
+
+def test_try_submit_raises_when_the_queue_is_full():
+    executor = get_executor('bench.full', max_workers=1, max_queue=1)
+    release = threading.Event()
+    futures = [executor.submit(release.wait) for _ in range(2)]
+    try:
+        executor.try_submit(release.wait)
+    except queue.Full:
+        pass
+    else:
+        raise AssertionError("try_submit did not raise queue.Full")
+    finally:
+        release.set()
+    assert all(future.result() for future in futures)
+
+
+def test_executor_mode_is_part_of_the_pool_identity():
+    assert get_executor().mode == 'thread'
+    process = get_executor(mode='process')
+    assert process.mode == 'process' and process.name == 'default.process'
+    get_executor('bench.mode')
+    try:
+        get_executor('bench.mode', mode='process')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("mode mismatch did not raise ValueError")
+
+
+if __name__ == "__main__":
+    main()
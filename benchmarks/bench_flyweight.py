@@ -0,0 +1,123 @@
+"""
+Cost of a P/L created at the top of a hot function vs the shared_printer()/shared_logger() flyweights:
+time per call and memory allocated (tracemalloc) over N calls, and the instance sizes (__slots__, no __dict__).
+
+Usage: python benchmarks/bench_flyweight.py [--number 1000000] [--case "P*"]
+"""
+import argparse
+import fnmatch
+import gc
+import io
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark.helper import L, P, shared_logger, shared_printer  # noqa: E402
+from pyquark.instrument import STATS  # noqa: E402
+
+
+class Service(object):
+    pass
+
+
+SERVICE = Service()
+LOGGER = {'application': 'bench.flyweight', 'log_to_console': False, 'omit': True}
+
+
+def p_per_call():
+    p = P(inst=SERVICE, omit=True)
+    p.print("skipped")
+
+
+def p_shared():
+    p = shared_printer(inst=SERVICE, omit=True)
+    p.print("skipped")
+
+
+def l_per_call():
+    log = L(inst=SERVICE, **LOGGER)
+    log.print("skipped")
+
+
+def l_shared():
+    log = shared_logger(inst=SERVICE, **LOGGER)
+    log.print("skipped")
+
+
+CASES = {'P() per call': p_per_call, 'shared_printer()': p_shared,
+         'L() per call': l_per_call, 'shared_logger()': l_shared}
+
+
+def measure(func, number):
+    """(ns per call, tracemalloc peak bytes over the loop, bytes still allocated per call) of <number> calls"""
+    func()  # Creates the shared instances and warms the prefix cache
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(number):
+        func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / number * 1e9, peak - before, (current - before) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=1000000)
+    parser.add_argument('--case', action='append', help='case name pattern (repeatable)')
+    args = parser.parse_args()
+
+    print(f"P instance: {sys.getsizeof(P(omit=True))} bytes, "
+          f"L instance: {sys.getsizeof(L(**LOGGER))} bytes (no __dict__)")
+    print("{:<18} {:>10} {:>14} {:>14}".format('case', 'ns/call', 'peak, KiB', 'kept, B/call'))
+    for name, func in CASES.items():
+        if args.case and not any(fnmatch.fnmatch(name, pattern) for pattern in args.case):
+            continue
+        per_call, peak, kept = measure(func, args.number)
+        print(f"{name:<18} {per_call:>10.0f} {peak / 1024:>14.1f} {kept:>14.2f}")
+
+
+def test_shared_logger_prefixes_are_per_call_site_across_threads():
+    log = shared_logger(application='bench.flyweight.threads', log_to_console=True, debug=True, instrument=True)
+    stream = io.StringIO()
+    for handler in log.logger.handlers:
+        handler.setStream(stream)
+    # Instrumentation which yields to the other thread right after the prefix is computed
+    STATS.get(log.logger.name).prefix_time = lambda elapsed: time.sleep(0)
+    barrier = threading.Barrier(2)
+
+    def alpha():
+        for _ in range(2000):
+            log.gprint("from alpha")
+
+    def beta():
+        for _ in range(2000):
+            log.gprint("from beta")
+
+    def run(func):
+        barrier.wait()
+        func()
+
+    threads = [threading.Thread(target=run, args=(func,)) for func in (alpha, beta)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 4000
+    for line in lines:
+        name = 'alpha' if 'from alpha' in line else 'beta'
+        assert f'.{name}]  ' in line, line
+
+
+if __name__ == "__main__":
+    main()
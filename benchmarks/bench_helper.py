@@ -0,0 +1,290 @@
+"""
+Benchmark suite of the pyquark.helper hot paths.
+
+Runnable module (multi-threaded load, JSON results to track regressions between releases):
+    python benchmarks/bench_helper.py --threads 4 --number 2000 --output bench_helper.json
+    python benchmarks/bench_helper.py --list
+    python benchmarks/bench_helper.py --case "P.print" --case "slugify*"
+
+pytest-benchmark cases (single thread):
+    pytest benchmarks/bench_helper.py --benchmark-json=bench_helper.json
+"""
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark import helper  # noqa: E402
+from pyquark.helper import (L, P, logs_prefix, print_dict, slugify, slugify_many, switch, switch2,  # noqa: E402
+                            switch_reverse_yesno)
+
+CASES = {}
+BATCH = 50  # Calls per latency sample
+LOG_DIR = tempfile.mkdtemp(prefix='pyquark-bench-')
+
+
+def case(name):
+    """Registers a case: the decorated function sets it up and returns the callable to measure"""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class Service(object):
+    ON = 'on'
+    OFF = 'off'
+
+    def __init__(self):
+        self.enabled = False
+
+    @switch
+    def set_enabled(self, value, **kwargs):
+        return value
+
+    @switch2
+    def set_mode(self, value, **kwargs):
+        return value
+
+    @switch_reverse_yesno
+    def get_enabled(self, **kwargs):
+        return self.enabled
+
+
+def _logger(name, debug=True, log_to_console=True, log_to_file=False):
+    log = L(application=f'bench.helper.{name}', debug=debug, log_to_console=log_to_console,
+            log_to_file=log_to_file, log_dir=LOG_DIR, init=True, cls=Service)
+    for handler in log.logger.handlers if log.logger else ():
+        target = getattr(handler, 'target', handler)
+        if not hasattr(target, 'baseFilename'):
+            target.setStream(io.StringIO())
+    return log
+
+
+@case('P.print')
+def p_print():
+    p = P(cls=Service)
+    return lambda: p.print("message")
+
+
+@case('P.print, omit')
+def p_print_omit():
+    p = P(cls=Service, omit=True)
+    return lambda: p.print("message")
+
+
+@case('P.gprint')
+def p_gprint():
+    p = P(cls=Service)
+    return lambda: p.gprint("message")
+
+
+@case('P.gprint, omit_all')
+def p_gprint_omit_all():
+    p = P(cls=Service, omit_all=True)
+    return lambda: p.gprint("message")
+
+
+@case('L.print, console')
+def l_print_console():
+    log = _logger('console')
+    return lambda: log.print("message")
+
+
+@case('L.print, console+file')
+def l_print_console_file():
+    log = _logger('console_file', log_to_file=True)
+    return lambda: log.print("message")
+
+
+@case('L.print, disabled level')
+def l_print_disabled():
+    log = _logger('disabled', debug=False, log_to_file=True)
+    return lambda: log.print(lambda: "message")
+
+
+@case('L.print, disabled level, flight recorder')
+def l_print_flight_recorder():
+    log = _logger('flight', debug=False, log_to_file=True)
+    log.set_flight_recorder(1000)
+    return lambda: log.print(lambda: "message")
+
+
+@case('L.print, no handlers')
+def l_print_no_handlers():
+    log = _logger('none', log_to_console=False)
+    return lambda: log.print("message")
+
+
+def _nested(depth, func):
+    if depth:
+        return _nested(depth - 1, func)
+    return func()
+
+
+for _depth in (1, 10, 50):
+    case(f'logs_prefix, depth {_depth}')(
+        lambda depth=_depth: lambda: _nested(depth, lambda: logs_prefix(5, 3, cls=Service)))
+
+
+def _big_structure(width=8, depth=3):
+    if not depth:
+        return 'value'
+    return {f'key{i}': [_big_structure(width, depth - 1), (i, str(i)), {i}] for i in range(width)}
+
+
+@case('print_dict, nested 8x3')
+def print_dict_nested():
+    data = _big_structure()
+    return lambda: print_dict("State:", data)
+
+
+@case('slugify, ascii')
+def slugify_ascii():
+    return lambda: slugify("Some Logger Name -- v2")
+
+
+@case('slugify, unicode')
+def slugify_unicode():
+    return lambda: slugify("Ĉu vi parolas Esperanton? Привет")
+
+
+@case('slugify_many, 100 names')
+def slugify_batch():
+    names = [f"Service {i % 20} -- Worker" for i in range(100)]
+    return lambda: list(slugify_many(names))
+
+
+@case('switch')
+def switch_setter():
+    service = Service()
+    return lambda: service.set_enabled('ON')
+
+
+@case('switch2')
+def switch2_setter():
+    service = Service()
+    return lambda: service.set_mode('off')
+
+
+@case('switch_reverse_yesno')
+def switch_getter():
+    service = Service()
+    return service.get_enabled
+
+
+@contextlib.contextmanager
+def quiet():
+    """Console output of the cases goes to /dev/null"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(name, threads=1, number=2000):
+    """Runs the case in <threads> threads, <number> calls each. Returns the results dict"""
+    func = CASES[name]()
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        local = []
+        barrier.wait()
+        for _ in range(max(1, number // BATCH)):
+            start = time.perf_counter_ns()
+            for _ in range(BATCH):
+                func()
+            local.append((time.perf_counter_ns() - start) / BATCH)
+        with lock:
+            samples.extend(local)
+
+    for _ in range(BATCH):
+        func()  # Warm up caches
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    calls = len(samples) * BATCH
+    return {
+        'name': name,
+        'threads': threads,
+        'calls': calls,
+        'ops_per_sec': calls / elapsed if elapsed else 0.0,
+        'mean_ns': statistics.fmean(samples),
+        'p50_ns': samples[len(samples) // 2],
+        'p95_ns': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'p99_ns': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def run(patterns=None, threads=1, number=2000):
+    names = [name for name in CASES if not patterns or any(fnmatch.fnmatch(name, p) for p in patterns)]
+    with quiet():
+        results = [measure(name, threads, number) for name in names]
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'threads': threads,
+            'number': number,
+            'prefix_cache_size': helper.PREFIX_CACHE_SIZE,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--number', type=int, default=2000, help='calls per thread')
+    parser.add_argument('--case', action='append', help='case name or glob (repeatable)')
+    parser.add_argument('--output', help='write JSON results to the file')
+    parser.add_argument('--list', action='store_true', help='list the cases')
+    args = parser.parse_args()
+    if args.list:
+        print('\n'.join(CASES))
+        return
+    report = run(args.case, args.threads, args.number)
+    print("{:<28} {:>8} {:>12} {:>10} {:>10} {:>10}".format('case', 'threads', 'ops/s', 'p50, ns', 'p95, ns',
+                                                            'p99, ns'))
+    for row in report['results']:
+        print("{name:<28} {threads:>8} {ops_per_sec:>12.0f} {p50_ns:>10.0f} {p95_ns:>10.0f} {p99_ns:>10.0f}"
+              .format(**row))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+try:
+    import pytest
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    pytest = None
+
+if pytest is not None:
+    @pytest.mark.parametrize('name', list(CASES))
+    def test_helper(benchmark, name):
+        func = CASES[name]()
+        with quiet():
+            benchmark(func)
+
+
+if __name__ == "__main__":
+    main()
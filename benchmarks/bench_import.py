@@ -0,0 +1,109 @@
+"""
+Import time of pyquark.helper (python -X importtime) and its side effects.
+
+Each run imports the module in a fresh interpreter in an empty working directory, then checks that
+the import created no files (e.g. "logs/") and did not load the modules which are imported on first use.
+
+    python benchmarks/bench_import.py --number 10 --top 15
+    python benchmarks/bench_import.py --module pyquark.query --output bench_import.json
+
+pytest:
+    pytest benchmarks/bench_import.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use only
+LAZY_MODULES = ('json', 'unicodedata', 'logging.handlers', 'concurrent.futures', 'inspect', 'typing', 'socket',
+                'asyncio')
+
+
+def import_once(module: str = 'pyquark.helper'):
+    """
+    Imports the module in a new interpreter. Returns (timings, loaded, files):
+    timings: {module: (self us, cumulative us)}, loaded: LAZY_MODULES which were imported,
+    files: files created in the working directory
+    """
+    # json of the check itself is imported after the measured module: it is checked in the importtime output
+    code = (f"import sys, {module}, json\n"
+            f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules and m != 'json']))")
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True)
+        files = sorted(os.listdir(cwd))
+    timings = {}
+    measured = True
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if measured:
+            timings[name] = (int(self_us), int(cumulative_us))
+        if name == module:
+            measured = False  # The rest is imported by the check
+    loaded = json.loads(result.stdout)
+    if 'json' in timings:
+        loaded.insert(0, 'json')
+    return timings, loaded, files
+
+
+def run(module: str = 'pyquark.helper', number: int = 5, top: int = 10):
+    totals = []
+    slowest = {}
+    loaded, files = [], []
+    for _ in range(number):
+        timings, loaded, files = import_once(module)
+        totals.append(timings[module][1])
+        for name, (self_us, _) in timings.items():
+            slowest.setdefault(name, []).append(self_us)
+    return {
+        'module': module,
+        'python': sys.version.split()[0],
+        'number': number,
+        'median_us': statistics.median(totals),
+        'min_us': min(totals),
+        'slowest_self_us': sorted(((name, statistics.median(values)) for name, values in slowest.items()),
+                                  key=lambda item: -item[1])[:top],
+        'lazy_modules_loaded': loaded,
+        'files_created': files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--module', default='pyquark.helper')
+    parser.add_argument('--number', type=int, default=5, help='interpreter runs')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to show')
+    parser.add_argument('--output', help='write JSON results to the file')
+    args = parser.parse_args()
+    report = run(args.module, args.number, args.top)
+    print(f"{report['module']}: median {report['median_us'] / 1000:.1f} ms, min {report['min_us'] / 1000:.1f} ms "
+          f"({report['number']} runs)")
+    for name, self_us in report['slowest_self_us']:
+        print(f"  {name:<40} {self_us / 1000:>8.2f} ms")
+    if report['lazy_modules_loaded']:
+        print(f"Imported eagerly: {', '.join(report['lazy_modules_loaded'])}")
+    if report['files_created']:
+        print(f"Created on import: {', '.join(report['files_created'])}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    return 1 if report['lazy_modules_loaded'] or report['files_created'] else 0
+
+
+def test_import_has_no_side_effects():
+    _, loaded, files = import_once('pyquark.helper')
+    assert not files, f"Created on import: {files}"
+    assert not loaded, f"Imported eagerly: {loaded}"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Cost of L print calls for disabled levels (debug=False drops DEBUG records) versus enabled ones.
+A disabled call returns before the lazy message is evaluated and the prefix is computed: a few hundred ns,
+tens of times less than an enabled one.
+
+Usage: python benchmarks/bench_levels.py [--number N]
+
+pytest (generous bounds, to catch a lost fast path rather than to measure):
+    pytest benchmarks/bench_levels.py
+"""
+import argparse
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark.helper import L  # noqa: E402
+
+
+def make_logger(debug):
+    log = L(application=f'bench.levels.{debug}', debug=debug, init=True)
+    log.logger.propagate = False  # Only its own handlers (pytest adds a NOTSET handler to the root logger)
+    log.invalidate_levels()
+    for handler in log.logger.handlers:
+        handler.setStream(io.StringIO())
+    return log
+
+
+def cases():
+    disabled = make_logger(debug=False)
+    enabled = make_logger(debug=True)
+    omitted = L(application='bench.levels.omit', omit=True, log_to_console=False)
+    message = lambda: "state: {}".format(list(range(10)))  # noqa: E731
+    return [
+        ('print, disabled', lambda: disabled.print(message)),
+        ('yprint, disabled', lambda: disabled.yprint(message)),
+        ('bprint, disabled', lambda: disabled.bprint("plain string")),
+        ('print, omit', lambda: omitted.print(message)),
+        ('print, enabled', lambda: enabled.print(message)),
+        ('gprint, enabled', lambda: enabled.gprint(message)),
+    ]
+
+
+def run(number):
+    baseline = min(timeit.repeat(lambda: None, number=number, repeat=5)) / number
+    results = []
+    for name, func in cases():
+        seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+        results.append({'case': name, 'ns': max(seconds - baseline, 0) * 1e9})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+    for row in run(args.number):
+        print("{case:<20} {ns:>10.0f} ns/call".format(**row))
+
+
+def test_disabled_levels_skip_the_work():
+    evaluated = []
+    disabled = make_logger(debug=False)
+    disabled.print(lambda: evaluated.append(1))
+    assert not evaluated, "lazy message of a disabled level was evaluated"
+    results = {row['case']: row['ns'] for row in run(5000)}
+    enabled = min(results['print, enabled'], results['gprint, enabled'])
+    for name in ('print, disabled', 'yprint, disabled', 'bprint, disabled', 'print, omit'):
+        assert results[name] < 3000, f"{name}: {results[name]:.0f} ns/call"
+        assert results[name] * 10 < enabled, f"{name}: {results[name]:.0f} ns/call, enabled {enabled:.0f}"
+
+
+if __name__ == "__main__":
+    main()
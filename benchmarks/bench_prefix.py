@@ -0,0 +1,67 @@
+"""
+Per-call cost of the L call-site prefix with and without the prefix cache.
+The caller is wrapped into <wrappers> decorators, which the prefix walk has to skip.
+
+Usage: python benchmarks/bench_prefix.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark import helper  # noqa: E402
+from pyquark.helper import L  # noqa: E402
+
+
+def decorate(func):
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def make_caller(log, wrappers, use_prefix=True):
+    # Same frame layout as L.print: caller -> xprint method -> prefix
+    def print_method():
+        return log.prefix if use_prefix else None
+
+    def handler():
+        return print_method()
+
+    for _ in range(wrappers):
+        handler = decorate(handler)
+    return handler
+
+
+def per_call_ns(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def run(number):
+    log = L(application='bench.prefix', log_to_console=False, cls=L, decorator='bench')
+    results = []
+    for wrappers in (0, 5, 25):
+        baseline = per_call_ns(make_caller(log, wrappers, use_prefix=False), number)
+        row = {'wrappers': wrappers}
+        for label, size in (('uncached', 0), ('cached', 1024)):
+            helper.set_prefix_cache_size(size)
+            helper.clear_prefix_cache()
+            row[label] = max(per_call_ns(make_caller(log, wrappers), number) - baseline, 1.0)
+        results.append(row)
+    helper.set_prefix_cache_size(1024)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+    print("{:>8} {:>14} {:>14} {:>8}".format('wrappers', 'uncached, ns', 'cached, ns', 'speedup'))
+    for row in run(args.number):
+        print("{wrappers:>8} {uncached:>14.0f} {cached:>14.0f} {:>7.1f}x".format(row['uncached'] / row['cached'],
+                                                                                 **row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Per-call cost of the switch, switch2 and switch_reverse_yesno decorators: current ones vs the legacy ones,
+which created a P (call-site prefix walk) and lower-cased ON/OFF on every call.
+
+Usage: python benchmarks/bench_switch.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyquark.helper import P, switch, switch2, switch_reverse_yesno  # noqa: E402
+
+
+def legacy_switch(func):
+    def func_wrapper(self, value, **kwargs):
+        p = P(inst=self, decorator='switch', omit=True)
+        cls = self.__class__
+        ON = self.ON.lower() if getattr(self, 'ON') else 'yes'
+        OFF = self.OFF.lower() if getattr(self, 'OFF') else 'no'
+        attr_name = func.__name__.replace('set_', '')
+        if isinstance(value, bool):
+            pass
+        elif value.lower() == ON:
+            value = True
+        elif value.lower() == OFF:
+            value = False
+        else:
+            p.rprint('Error: wrong "switch" attribute (value = {}). {} or {} is expected.'.format(value, ON, OFF))
+            value = None
+        if attr_name in cls.__dict__.keys() and value is not None:
+            self.__setattr__(attr_name, value)
+        return func(self, value, **kwargs)
+    return func_wrapper
+
+
+def legacy_switch2(func):
+    def func_wrapper(self, value, **kwargs):
+        p = P(inst=self, decorator='switch', omit=True)
+        ON = self.ON.lower() if getattr(self, 'ON') else 'yes'
+        OFF = self.OFF.lower() if getattr(self, 'OFF') else 'no'
+        if isinstance(value, bool):
+            pass
+        elif value.lower() == ON:
+            value = True
+        elif value.lower() == OFF:
+            value = False
+        else:
+            p.rprint('Error: wrong "switch" attribute (value = {}). {} or {} is expected.'.format(value, ON, OFF))
+            return None
+        kwargs['_attr_name_'] = func.__name__.replace('set_', '')
+        return func(self, value, **kwargs)
+    return func_wrapper
+
+
+def legacy_switch_reverse_yesno(func):
+    def func_wrapper(self, **kwargs):
+        p = P(inst=self, decorator='switch_reverse_yesno', omit=True)
+        ON = self.ON.lower() if getattr(self, 'ON') else 'yes'
+        OFF = self.OFF.lower() if getattr(self, 'OFF') else 'no'
+        attr_name = func.__name__.replace('get_', '')
+        value = func(self, **kwargs)
+        if isinstance(value, bool):
+            return ON if value else OFF
+        p.rprint(f'Error: wrong "{attr_name}" switch attribute (value = {value}). Boolean is expected.')
+        return None
+    return func_wrapper
+
+
+def make_service(on_off, on_off2, reverse):
+    class Service(object):
+        ON = 'On'
+        OFF = 'Off'
+        enabled = False
+
+        @on_off
+        def set_enabled(self, value, **kwargs):
+            return value
+
+        @on_off2
+        def set_mode(self, value, **kwargs):
+            return value
+
+        @reverse
+        def get_enabled(self, **kwargs):
+            return self.enabled
+    return Service()
+
+
+def per_call_ns(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def run(number):
+    services = {'legacy': make_service(legacy_switch, legacy_switch2, legacy_switch_reverse_yesno),
+                'current': make_service(switch, switch2, switch_reverse_yesno)}
+    cases = (('switch', lambda service: lambda: service.set_enabled('ON')),
+             ('switch, bool', lambda service: lambda: service.set_enabled(True)),
+             ('switch2', lambda service: lambda: service.set_mode('off')),
+             ('switch_reverse_yesno', lambda service: service.get_enabled))
+    results = []
+    for name, make_call in cases:
+        row = {'case': name}
+        for label, service in services.items():
+            row[label] = per_call_ns(make_call(service), number)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+    print("{:<22} {:>12} {:>12} {:>8}".format('case', 'legacy, ns', 'current, ns', 'speedup'))
+    for row in run(args.number):
+        print("{case:<22} {legacy:>12.0f} {current:>12.0f} {:>7.1f}x".format(row['legacy'] / row['current'], **row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+asyncio-aware L logger.
+
+Records logged from coroutines are only enqueued: console and file handlers (and the midnight rollover of the
+file handler) run in the writer thread, the overflow policy never blocks the event loop. The prefix names
+the coroutine and the task: "[Owner.caller.coroutine@Task-12]  ".
+
+Usage:
+    async def main():
+        async with AsyncL(application='service', log_to_file=True) as log:
+            log.gprint("started")
+            ...
+        # Records are written and the handlers closed here
+
+    await log.aflush()      # waits for the queued records without blocking the loop
+    await log.aclose()      # aflush, then close the logger handlers
+
+log.flush() (inherited from L) blocks: call it from synchronous code only.
+"""
+import asyncio
+import time
+
+from pyquark.handlers import BackgroundHandler, BackgroundWriter
+from pyquark.helper import L, call_site_prefix
+
+
+class AsyncL(L):
+    """
+    L for the asyncio services. Takes the L arguments; background defaults to the shared writer
+    of ASYNC_QUEUE_SIZE records with the ASYNC_OVERFLOW policy (drop_oldest: the loop never waits for a slot,
+    dropped records are counted by dropped_records).
+    The default logger is DEFAULT_LOGGER_NAME ('pyquark.async'), not the one of L. Synchronous handlers
+    of a logger created by L (same application name) are moved behind the writer of this AsyncL, so their
+    writes leave the loop thread too.
+    """
+    DEFAULT_LOGGER_NAME = 'pyquark.async'
+    ASYNC_QUEUE_SIZE = 100000
+    ASYNC_OVERFLOW = BackgroundWriter.DROP_OLDEST
+    _async_writer = None
+    __slots__ = ()
+
+    def __init__(self, application: str = DEFAULT_LOGGER_NAME, **kwargs):
+        if not kwargs.get('background'):
+            kwargs['background'] = self.async_writer()
+        super(AsyncL, self).__init__(application=application, **kwargs)
+        if self.logger is not None:
+            handlers = self.logger.handlers
+            for index, handler in enumerate(handlers):
+                if not isinstance(handler, BackgroundHandler):
+                    handlers[index] = BackgroundHandler(handler, self.background)
+            self.invalidate_levels()
+
+    @classmethod
+    def async_writer(cls) -> BackgroundWriter:
+        """Shared non-blocking writer of the AsyncL loggers (created on first use)"""
+        if AsyncL._async_writer is None:
+            AsyncL._async_writer = BackgroundWriter(maxsize=cls.ASYNC_QUEUE_SIZE, overflow=cls.ASYNC_OVERFLOW,
+                                                    name='pyquark.async_writer')
+        return AsyncL._async_writer
+
+    @property
+    def prefix(self):
+        # Frames: call_site_prefix -> prefix -> xprint method -> caller
+        if self.native:
+            return ''
+        stats = self._stats
+        start = time.perf_counter_ns() if stats is not None else 0
+        prefix = call_site_prefix(3, 2, owner=self.inst.__class__ if self.inst else self.inst_class,
+                                  decorator=self.decorator or None)
+        loop = asyncio._get_running_loop()
+        task = asyncio.current_task(loop) if loop is not None else None
+        if task is not None:
+            prefix = prefix[:-3] + '@' + task.get_name() + ']  '
+        if stats is not None:
+            stats.prefix_time(time.perf_counter_ns() - start)
+        return prefix
+
+    async def aflush(self, timeout: float = None):
+        """Waits until the queued records are written and the handlers flushed (in an executor thread)"""
+        await asyncio.get_running_loop().run_in_executor(None, self.flush, timeout)
+
+    async def aclose(self, timeout: float = None):
+        """Writes out the queued records, then removes and closes the handlers of the logger"""
+        await self.aflush(timeout)
+        if self.logger is None:
+            return
+        handlers = self.logger.handlers[:]
+        for handler in handlers:
+            self.logger.removeHandler(handler)
+        self.invalidate_levels()
+
+        def close():
+            for handler in handlers:
+                try:
+                    handler.close()
+                except Exception:
+                    pass  # Closed already
+
+        await asyncio.get_running_loop().run_in_executor(None, close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
@@ -0,0 +1,371 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from multiprocessing.connection import Listener, Client, wait
+
+from pyquark.handlers import LevelWatch
+from pyquark.rotation import Compressor, RotatingFileHandler
+
+_STOP = 'stop'
+_PLAIN = (str, int, float, bool, type(None))
+
+
+def _safe(value, depth: int = 0):
+    """Picklable (and JSON-safe) copy of a record value: containers are copied, other objects become str()"""
+    if type(value) in _PLAIN:
+        return value
+    if depth < 8:
+        if isinstance(value, dict):
+            return {key if type(key) in _PLAIN else str(key): _safe(item, depth + 1) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_safe(item, depth + 1) for item in value]
+    return str(value)
+
+
+class LogCollector(object):
+    """
+    Aggregator process which owns the log files of many worker processes.
+    Workers send batches of records over a local connection (Unix socket or named pipe), the aggregator
+    writes them into "<log_dir>/<logger name>.log" files rotated at midnight. Records of each worker
+    process are written in the order they were logged. No APPLICATION_INDEX per process is needed.
+
+    Usage:
+        collector = LogCollector(log_dir="logs").start()
+        # in the worker processes (pass collector.address and collector.authkey to them):
+        log = L("worker", log_to_file=True, collector=collector.address)
+
+    Parameters:
+        log_dir: directory of the log files (L.LOG_DIR by default)
+        address: listener address. Default: a new Unix socket (named pipe on Windows)
+        authkey: optional authentication key of the worker connections
+        formatter: file records formatter (L.LOG_FORMAT by default)
+        flush_interval: max seconds between the file writes
+        context: multiprocessing start method of the aggregator process
+        compress: 'gzip' or 'lzma' - compress the rotated files
+    """
+
+    def __init__(self,
+                 log_dir: str = None,
+                 address=None,
+                 authkey: bytes = None,
+                 formatter: logging.Formatter = None,
+                 when: str = 'midnight',
+                 backup_count: int = 30,
+                 flush_interval: float = 0.5,
+                 context: str = 'spawn',
+                 compress: str = None):
+        if log_dir is None or formatter is None:
+            from pyquark.helper import L
+            log_dir = log_dir or L.LOG_DIR
+            formatter = formatter or L.LOG_FORMAT
+        self.log_dir = log_dir
+        self.address = address
+        self.authkey = authkey
+        self.formatter = formatter
+        self.when = when
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.context = context
+        self.compress = compress
+        self._process = None
+        self._control = None
+
+    def start(self):
+        """Spawns the aggregator process and waits until it listens. Returns self"""
+        if self._process is not None:
+            return self
+        ctx = multiprocessing.get_context(self.context)
+        self._control, child = ctx.Pipe()
+        self._process = ctx.Process(target=serve,
+                                    args=(child, self.address, self.authkey, self.log_dir, self.formatter,
+                                          self.when, self.backup_count, self.flush_interval, self.compress),
+                                    name='pyquark.collector',
+                                    daemon=True)
+        self._process.start()
+        child.close()
+        self.address = self._control.recv()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout: float = 10):
+        """Writes out the received records and stops the aggregator. Stop it after the workers are done"""
+        if self._process is None:
+            return
+        try:
+            self._control.send(_STOP)
+        except (OSError, EOFError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._control.close()
+        self._process = None
+
+    @property
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+
+class _BatchWriter(object):
+    """Aggregator side: writes record batches into per-logger rotating files, flushing once per batch"""
+
+    def __init__(self, log_dir, formatter, when, backup_count, compress=None):
+        self.log_dir = log_dir
+        self.compress = compress
+        self.formatter = formatter
+        self.when = when
+        self.backup_count = backup_count
+        self.handlers = {}
+        self._dirty = set()
+
+    def handler(self, name):
+        handler = self.handlers.get(name)
+        if handler is None:
+            handler = RotatingFileHandler(filename=os.path.join(self.log_dir, f"{name.lower()}.log"),
+                                          when=self.when,
+                                          backupCount=self.backup_count,
+                                          compress=self.compress)
+            handler.setFormatter(self.formatter)
+            self.handlers[name] = handler
+        return handler
+
+    def write(self, batch):
+        for state in batch:
+            record = logging.makeLogRecord(state)
+            handler = self.handler(record.name)
+            try:
+                if handler.shouldRollover(record):
+                    handler.doRollover()
+                handler.stream.write(handler.format(record) + handler.terminator)
+            except Exception:
+                handler.handleError(record)
+            self._dirty.add(handler)
+
+    def flush(self):
+        for handler in self._dirty:
+            handler.flush()
+        self._dirty.clear()
+
+    def close(self):
+        self.flush()
+        for handler in self.handlers.values():
+            handler.close()
+        if self.compress:
+            Compressor.shared().join()  # No atexit in the aggregator process
+
+
+def serve(control, address, authkey, log_dir, formatter, when, backup_count, flush_interval, compress=None):
+    """Aggregator process main loop"""
+    os.makedirs(log_dir, exist_ok=True)
+    listener = Listener(address, backlog=128, authkey=authkey)
+    control.send(listener.address)
+    connections = []
+    lock = threading.Lock()
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except multiprocessing.AuthenticationError:
+                continue
+            except OSError:
+                return
+            with lock:
+                connections.append(conn)
+
+    threading.Thread(target=accept, name='pyquark.collector.accept', daemon=True).start()
+    writer = _BatchWriter(log_dir, formatter, when, backup_count, compress)
+    stopping = False
+    while True:
+        with lock:
+            waitables = [control] + connections
+        # After the stop request: drain what the workers have sent (including the connections not accepted yet),
+        # and exit when nothing is received during the flush interval
+        ready = wait(waitables, timeout=flush_interval)
+        received = not stopping  # Keep running for one more interval after the stop request
+        for conn in ready:
+            if conn is control:
+                try:
+                    stopping = control.recv() == _STOP or stopping
+                except (EOFError, OSError):
+                    stopping = True
+                continue
+            try:
+                batch = conn.recv()
+            except (EOFError, OSError):
+                with lock:
+                    connections.remove(conn)
+                conn.close()
+                continue
+            writer.write(batch)
+            received = True
+        writer.flush()
+        if stopping and not received:
+            break
+    writer.close()
+    listener.close()
+
+
+class CollectorHandler(LevelWatch, logging.Handler):
+    """
+    Worker side: buffers records and sends them to the LogCollector in batches
+    (when <batch_size> records are buffered, every <flush_interval> seconds, on flush and at exit).
+    Reconnects after fork, so records of each process go through their own connection.
+    """
+
+    def __init__(self, address, authkey: bytes = None, batch_size: int = 100, flush_interval: float = 0.5,
+                 level=logging.NOTSET):
+        super(CollectorHandler, self).__init__(level)
+        self.address = address
+        self.authkey = authkey
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._conn = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def _connection(self, retries: int = 3):
+        if self._conn is None:
+            for attempt in range(retries):
+                try:
+                    self._conn = Client(self.address, authkey=self.authkey)
+                    break
+                except OSError:
+                    if attempt == retries - 1:
+                        raise
+                    time.sleep(0.1 * (attempt + 1))
+        return self._conn
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # New process (or first record): don't reuse the parent connection and records
+            self._pid = os.getpid()
+            self._conn = None
+            self._buffer = []
+            threading.Thread(target=self._flusher, name='pyquark.collector.flush', daemon=True).start()
+
+    def _flusher(self):
+        pid = os.getpid()
+        while not self._closed and self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass  # Keep flushing: the failed batch is reported by _send
+
+    @staticmethod
+    def prepare(record):
+        """
+        Picklable record state with the message merged with args (same as SocketHandler does).
+        Values other than str, int, float, bool and None (fields, text, extra attributes) are reduced to
+        JSON-safe copies, objects to their str()
+        """
+        state = dict(record.__dict__)
+        state['msg'] = record.getMessage()
+        state['args'] = None
+        if record.exc_info:
+            state['exc_text'] = logging.Formatter().formatException(record.exc_info)
+        state['exc_info'] = None
+        state.pop('message', None)
+        for key, value in state.items():
+            if type(value) not in _PLAIN:
+                state[key] = _safe(value)
+        return state
+
+    def emit(self, record):
+        try:
+            self._check_pid()
+            self._buffer.append(self.prepare(record))
+            if len(self._buffer) >= self.batch_size:
+                self._send()
+        except Exception:
+            self.handleError(record)
+
+    def _send(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Drop only the records which still can't be pickled (str() of a value failed in prepare)
+            batch = [state for state in batch if self._picklable(state)]
+            data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+        try:
+            self._connection().send_bytes(data)
+        except (OSError, EOFError):
+            self._conn = None  # Reconnect on the next batch
+            raise
+
+    def _picklable(self, state) -> bool:
+        try:
+            pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+            return True
+        except Exception:
+            self.handleError(logging.makeLogRecord({'msg': state.get('msg'), 'name': state.get('name')}))
+            return False
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._pid == os.getpid():
+                self._send()
+        except (OSError, EOFError):
+            pass
+        finally:
+            self.release()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        super(CollectorHandler, self).close()
+
+
+def _worker(address, authkey, index, records):
+    from pyquark.helper import L
+    log = L(application='pyquark.collector.demo', log_to_file=True, log_to_console=False,
+            collector=address, collector_authkey=authkey)
+    for i in range(records):
+        log.print(f"worker={index} seq={i}")
+    log.flush()
+
+
+def main():
+    """Spawns an aggregator and a few worker processes, then checks per-process ordering of the records"""
+    import tempfile
+    log_dir = tempfile.mkdtemp()
+    workers, records = 4, 500
+    collector = LogCollector(log_dir=log_dir).start()
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=_worker, args=(collector.address, collector.authkey, i, records))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    collector.stop()
+
+    last = {}
+    with open(os.path.join(log_dir, 'pyquark.collector.demo.log')) as log_file:
+        lines = log_file.readlines()
+    for line in lines:
+        worker, seq = line.rsplit('worker=', 1)[1].split()
+        seq = int(seq.split('=')[1])
+        assert last.get(worker, -1) + 1 == seq, f"Out of order record: {line}"
+        last[worker] = seq
+    print(f"{len(lines)} records of {workers} workers in order: {log_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Shared and named worker pools behind start_as_thread.
+
+Usage:
+    executor = get_executor('io', max_workers=8, max_queue=100)
+    future = executor.submit(download, url)     # blocks while 8 + 100 tasks are pending (backpressure)
+    future.result()
+    executor.try_submit(download, url)          # raises queue.Full instead of blocking
+    executor.submit_within(5, download, url)    # waits up to 5 seconds for a slot
+
+Executor options are never taken from the keyword arguments: they are passed to the function as given.
+
+    cpu = get_executor('cpu', mode='process')   # ProcessPoolExecutor for CPU bound work
+    get_executor(mode='process')                # default process pool: 'default.process'
+
+    shutdown_executors()                        # also done at exit
+"""
+import atexit
+import concurrent.futures
+import importlib
+import queue
+import threading
+
+DEFAULT_EXECUTOR = 'default'
+THREAD = 'thread'
+PROCESS = 'process'
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class BoundedExecutor(object):
+    """
+    Thread or process pool with a bounded number of pending tasks.
+
+    Parameters:
+        name: executor name (thread name prefix)
+        max_workers: pool size. Default: concurrent.futures default of the mode
+        max_queue: max tasks waiting for a worker. None - unbounded
+        mode: 'thread' or 'process'
+    """
+
+    def __init__(self, name: str = DEFAULT_EXECUTOR, max_workers: int = None, max_queue: int = None,
+                 mode: str = THREAD):
+        if mode == THREAD:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix=f'pyquark.{name}')
+        elif mode == PROCESS:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            raise ValueError(f"mode must be {THREAD!r} or {PROCESS!r}, got {mode!r}")
+        self.name = name
+        self.mode = mode
+        self.max_workers = self._pool._max_workers
+        self.max_queue = max_queue
+        self._slots = None if max_queue is None else threading.BoundedSemaphore(self.max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._shutdown = False
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        """Schedules fn(*args, **kwargs). Returns the Future. When the queue is full: waits for a free slot"""
+        return self._submit(True, None, fn, args, kwargs)
+
+    def try_submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        """submit() which raises queue.Full instead of waiting when the queue is full"""
+        return self._submit(False, None, fn, args, kwargs)
+
+    def submit_within(self, timeout: float, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        """submit() which waits up to <timeout> seconds for a free slot, then raises queue.Full"""
+        return self._submit(True, timeout, fn, args, kwargs)
+
+    def _submit(self, block: bool, timeout: float, fn, args: tuple, kwargs: dict) -> concurrent.futures.Future:
+        if self._shutdown:
+            raise RuntimeError(f"Executor {self.name!r} is shut down")
+        if self._slots is not None and not self._slots.acquire(block, timeout):
+            raise queue.Full(f"Executor {self.name!r}: {self.max_workers + self.max_queue} tasks pending")
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        if self._slots is not None:
+            self._slots.release()
+        with self._lock:
+            if not future.cancelled() and future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    @property
+    def pending(self) -> int:
+        """Submitted tasks which are not done yet"""
+        return self.submitted - self.completed - self.failed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'name': self.name, 'mode': self.mode, 'max_workers': self.max_workers,
+                    'max_queue': self.max_queue, 'submitted': self.submitted, 'completed': self.completed,
+                    'failed': self.failed, 'pending': self.submitted - self.completed - self.failed}
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """Stops accepting tasks. wait: until the pending tasks are done, cancel_futures: drop the queued ones"""
+        self._shutdown = True
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def get_executor(name: str = DEFAULT_EXECUTOR, max_workers: int = None, max_queue: int = None,
+                 mode: str = THREAD) -> BoundedExecutor:
+    """
+    Executor of the name: created with the given parameters on the first call, shared after that.
+    The default process pool is named 'default.process'. Raises ValueError if the executor of the name
+    runs in another mode
+    """
+    if name == DEFAULT_EXECUTOR and mode == PROCESS:
+        name = f'{DEFAULT_EXECUTOR}.{PROCESS}'
+    executor = _executors.get(name)
+    if executor is None or executor._shutdown:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None or executor._shutdown:
+                executor = _executors[name] = BoundedExecutor(name, max_workers, max_queue, mode)
+    if executor.mode != mode:
+        raise ValueError(f"Executor {name!r} runs in {executor.mode!r} mode, {mode!r} requested")
+    return executor
+
+
+def shutdown_executors(wait: bool = True, cancel_futures: bool = False):
+    """Shuts down all the executors (registered at exit)"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+atexit.register(shutdown_executors)
+
+
+def call_wrapped(module: str, qualname: str, /, *args, **kwargs):
+    """
+    Process pool entry point: calls the original function of a decorated module level function.
+    Decorated functions can't be pickled by reference (the module attribute is the wrapper)
+    """
+    func = importlib.import_module(module)
+    for name in qualname.split('.'):
+        func = getattr(func, name)
+    return func.__wrapped__(*args, **kwargs)
@@ -0,0 +1,345 @@
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+
+INDEX_SUFFIX = '.idx'  # Sidecar indexes of pyquark.query
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'lzma': '.xz'}
+
+
+def __getattr__(name):
+    # File rotation pulls in logging.handlers (socket, pickle, ...): imported when a file handler is needed
+    if name in ('Compressor', 'RotatingFileHandler'):
+        from pyquark import rotation
+        return getattr(rotation, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LevelWatch(object):
+    """
+    Handler mixin: changing the handler level bumps the generation, so L instances re-read
+    their cached handler levels.
+    Instrumented handlers (stats: pyquark.instrument.HandlerStats) count the handled records,
+    the bytes written (text encoded with the stream encoding) and the time spent in emit.
+    """
+    generation = 0
+    stats = None
+
+    def setLevel(self, level):
+        super(LevelWatch, self).setLevel(level)
+        LevelWatch.generation += 1
+
+    def handle(self, record):
+        stats = self.stats
+        if stats is None:
+            return super(LevelWatch, self).handle(record)
+        start = time.perf_counter_ns()
+        rv = super(LevelWatch, self).handle(record)
+        if rv:
+            stats.emitted(time.perf_counter_ns() - start)
+        return rv
+
+    def format(self, record):
+        text = super(LevelWatch, self).format(record)
+        if self.stats is not None:
+            self.stats.written(self._encoded_size(text + getattr(self, 'terminator', '')))
+        return text
+
+    def _encoded_size(self, text) -> int:
+        if text.isascii():
+            return len(text)  # Same in the ASCII compatible encodings
+        stream = getattr(self, 'stream', None)
+        encoding = getattr(stream, 'encoding', None) or getattr(self, 'encoding', None) or 'utf-8'
+        try:
+            return len(text.encode(encoding, 'replace'))
+        except LookupError:
+            return len(text.encode('utf-8', 'replace'))
+
+
+class ConsoleHandler(LevelWatch, logging.StreamHandler):
+    pass
+
+
+class BackgroundWriter(object):
+    """
+    Bounded queue of log records drained by a single writer thread.
+    Records are handed to the target handlers in the writer thread, so console/file I/O
+    (and the midnight rollover of the file handler) never runs on the logging thread.
+
+    Overflow policies (when the queue is full):
+        block: the logging thread waits for a free slot
+        drop_oldest: the oldest queued record is discarded
+        drop_newest: the new record is discarded
+    """
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+    def __init__(self, maxsize: int = 10000, overflow: str = BLOCK, name: str = 'pyquark.writer'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy "{overflow}". One of {self.OVERFLOW_POLICIES} is expected.')
+        self.maxsize = max(1, int(maxsize))
+        self.overflow = overflow
+        self.name = name
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self._pending = 0  # Queued or being written
+        self._closed = False
+        self._thread = None
+        atexit.register(self.stop)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def put(self, handler: logging.Handler, record: logging.LogRecord) -> bool:
+        """Enqueue record for the handler. Returns False if the record was dropped"""
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return False
+            if self._thread is None:
+                self._start()
+            if len(self._queue) >= self.maxsize:
+                if self.overflow == self.DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                elif self.overflow == self.DROP_OLDEST:
+                    self._queue.popleft()
+                    self._pending -= 1
+                    self.dropped += 1
+                else:
+                    while len(self._queue) >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        self.dropped += 1
+                        return False
+            self._queue.append((handler, record))
+            self._pending += 1
+            self.queued += 1
+            self._not_empty.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                self._not_full.notify_all()
+            handlers = set()
+            for handler, record in batch:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    self.errors += 1
+                    handler.handleError(record)
+                handlers.add(handler)
+            for handler in handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    self.errors += 1
+            with self._lock:
+                self.written += len(batch)
+                self._pending -= len(batch)
+                if not self._pending:
+                    self._all_done.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until all queued records are written. Returns False on timeout"""
+        if self._thread is None or threading.current_thread() is self._thread:
+            return True
+        with self._lock:
+            return self._all_done.wait_for(lambda: not self._pending or not self._thread.is_alive(), timeout)
+
+    def stop(self, timeout: float = None):
+        """Write out the queued records and stop the writer thread. Called at exit"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if self._thread is not None and threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queued': self.queued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'pending': self._pending,
+            }
+
+
+class BackgroundHandler(LevelWatch, logging.Handler):
+    """
+    Forwards records to the <target> handler through the BackgroundWriter queue
+    """
+
+    def __init__(self, target: logging.Handler, writer: BackgroundWriter):
+        super(BackgroundHandler, self).__init__(level=target.level)
+        self.target = target
+        self.writer = writer
+
+    def setLevel(self, level):
+        super(BackgroundHandler, self).setLevel(level)
+        self.target.setLevel(level)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def handle(self, record):
+        rv = self.filter(record)
+        if rv:
+            self.writer.put(self.target, record)
+        return rv
+
+    def emit(self, record):
+        self.writer.put(self.target, record)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.flush()
+        self.target.close()
+        super(BackgroundHandler, self).close()
+
+
+class ColourFormatter(logging.Formatter):
+    """
+    Console formatter: wraps the message into the ANSI colour codes of the record "colour" attribute.
+    Records without the attribute are formatted as is, same as by the plain (file) formatter.
+
+    Parameters:
+        colours: semantic colour name -> ANSI code
+        reset: ANSI code appended after the coloured message
+    """
+
+    def __init__(self, fmt=None, datefmt=None, colours: dict = None, reset: str = '\033[0m', **kwargs):
+        super(ColourFormatter, self).__init__(fmt, datefmt, **kwargs)
+        self.colours = colours or {}
+        self.reset = reset
+
+    def formatMessage(self, record):
+        code = self.colours.get(getattr(record, 'colour', None))
+        if not code:
+            return super(ColourFormatter, self).formatMessage(record)
+        message = record.message
+        record.message = f"{code}{message}{self.reset}"
+        try:
+            return super(ColourFormatter, self).formatMessage(record)
+        finally:
+            record.message = message
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    JSON lines formatter: one JSON object per record.
+    {"ts": ..., "level": ..., "logger": ..., "class": ..., "function": ..., "decorator": ..., "message": ..., <fields>}
+    Call-site items are taken from the record attributes set by L (owner, prefix, decorator), extra items
+    from the record "fields" attribute (kwargs of the L xprint methods). Fields named as the items above (or "exc")
+    are written as "field_<name>", non-finite floats as strings ("nan", "inf"), so each line is valid JSON.
+    The line is joined from precomputed key fragments and C-escaped strings instead of a json.dumps() per record.
+    """
+    KEYS = ('ts', 'level', 'logger', 'class', 'function', 'decorator', 'message')
+    RESERVED = frozenset(KEYS + ('exc',))
+
+    def __init__(self, datefmt: str = '%Y-%m-%dT%H:%M:%S', site_cache_size: int = 1024):
+        super(JsonFormatter, self).__init__(datefmt=datefmt)
+        import json
+        from json.encoder import encode_basestring_ascii
+        self._dumps = json.dumps
+        self._encode = encode_basestring_ascii
+        self._fragments = {key: '{}:'.format(encode_basestring_ascii(key)) for key in self.RESERVED}
+        self._field_keys = {}
+        self._sites = {}
+        self._site_cache_size = site_cache_size
+        self._second = (None, '')  # (second, formatted): swapped at once, the formatter is shared by handlers
+
+    def _timestamp(self, record):
+        second = int(record.created)
+        cache = self._second
+        if cache[0] != second:
+            cache = self._second = (second, time.strftime(self.datefmt, self.converter(record.created)))
+        return '{}.{:03d}'.format(cache[1], int(record.msecs))
+
+    def _site(self, record):
+        """(class, function, decorator) of the L record prefix "[Class.caller.function.decorator]  " """
+        key = (getattr(record, 'prefix', ''), getattr(record, 'owner', ''), getattr(record, 'decorator', ''))
+        site = self._sites.get(key)
+        if site is None:
+            prefix, owner, decorator = key
+            function = prefix.strip()[1:-1]
+            if owner and function.startswith(owner + '.'):
+                function = function[len(owner) + 1:]
+            if decorator and function.endswith('.' + decorator):
+                function = function[:-len(decorator) - 1]
+            site = tuple(self._encode(item) if item else 'null' for item in (owner, function, decorator))
+            if len(self._sites) >= self._site_cache_size:
+                self._sites.clear()
+            self._sites[key] = site
+        return site
+
+    def _value(self, value):
+        if isinstance(value, str):
+            return self._encode(value)
+        if isinstance(value, float) and not math.isfinite(value):
+            return self._encode(str(value))  # NaN and Infinity are not JSON
+        if value is None or value is True or value is False or isinstance(value, (int, float)):
+            return self._dumps(value)
+        try:
+            return self._dumps(value, default=str, allow_nan=False)
+        except ValueError:
+            return self._encode(str(value))  # Non-finite floats inside
+
+    def _field_key(self, key):
+        fragment = self._field_keys.get(key)
+        if fragment is None:
+            name = str(key)
+            if name in self.RESERVED:
+                name = 'field_' + name
+            fragment = self._field_keys[key] = '{}:'.format(self._encode(name))
+        return fragment
+
+    def format(self, record):
+        fragments = self._fragments
+        text = getattr(record, 'text', None)
+        message = record.getMessage() if text is None else str(text)
+        owner, function, decorator = self._site(record)
+        parts = [
+            fragments['ts'], self._encode(self._timestamp(record)), ',',
+            fragments['level'], self._encode(record.levelname), ',',
+            fragments['logger'], self._encode(record.name), ',',
+            fragments['class'], owner, ',',
+            fragments['function'], function, ',',
+            fragments['decorator'], decorator, ',',
+            fragments['message'], self._encode(message),
+        ]
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            parts += [',', fragments['exc'], self._encode(record.exc_text)]
+        fields = getattr(record, 'fields', None)
+        if fields:
+            for key, value in fields.items():
+                parts += [',', self._field_key(key), self._value(value)]
+        return '{' + ''.join(parts) + '}'
@@ -1,28 +1,50 @@
 import sys
-import json
-import unicodedata
 import re
 import os
 import logging
-import logging.handlers
+import functools
+import itertools
 import time
-from datetime import datetime
-from threading import Thread
-from typing import Optional
+from collections import OrderedDict
+from threading import Lock
 
-def exec_time(func):
-    """Apply as decorator to any method to measure its exec time"""
-    def wrapper(*args, **kwargs):
-        start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        end_time = time.perf_counter()
-        execution_time = end_time - start_time
-        print(f"Execution time of {func.__name__}: {execution_time:.6f} seconds")
-        return result
-    return wrapper
+from pyquark.handlers import (BackgroundWriter, BackgroundHandler, ColourFormatter, ConsoleHandler, JsonFormatter,
+                              LevelWatch)
+from pyquark.instrument import STATS
+from pyquark.recorder import FlightRecorder
+from pyquark.throttle import SITE, TEMPLATE, RateLimiter, Sampler  # noqa: F401
 
+# Imported on first use (fast import of the module): json, unicodedata, logging.handlers (pyquark.rotation),
+# concurrent.futures (pyquark.executors), inspect (pyquark.metrics), asyncio (pyquark.aio)
 
-def target_directory(output_path: Optional[str] = None) -> str:
+
+def __getattr__(name):
+    if name == 'exec_time':
+        from pyquark.metrics import exec_time
+        return exec_time
+    if name == 'AsyncL':
+        from pyquark.aio import AsyncL
+        return AsyncL
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazyClassAttribute(object):
+    """Class attribute computed on first access (and stored in the class instead of the descriptor)"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.owner = self.name = None
+
+    def __set_name__(self, owner, name):
+        self.owner, self.name = owner, name
+
+    def __get__(self, instance, owner):
+        value = self.factory()
+        setattr(self.owner, self.name, value)
+        return value
+
+
+def target_directory(output_path: str = None) -> str:
     """
     Function for determining target directory of a download.
     Returns an absolute path (if relative one given) or the current
@@ -135,104 +157,242 @@ def rprint(string):
 def print_error(string):
     print("{}{}{}".format(Bcolors.FAIL, string, Bcolors.ENDC))
 
-def print_dict(info_string, data, indent=0, color=None):
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+
+
+def _dict_items(data):
+    if isinstance(data, dict):
+        return ((str(key), value) for key, value in data.items())
+    return (('[' + str(index) + ']', item) for index, item in enumerate(data))
+
+
+def iter_dict_lines(info_string, data, indent=0, max_depth=None, max_items=None):
+    """
+    Generator of the print_dict lines (without line ends and colors).
+    Walks nested dictionaries, lists, tuples, sets and frozensets iteratively (no recursion limit).
+
+    Parameters:
+    info_string (str): The information string, first line.
+    data (dict or list or tuple or set or frozenset): The data structure.
+    indent (int): The indentation level of the data structure. Default is 0.
+    max_depth (int): Nested containers deeper than max_depth are elided: "key:<dict> <...>". Default is None (no limit).
+    max_items (int): Only first max_items items of each container are rendered, the rest is elided:
+                     "... <N more>". Default is None (no limit).
+
+    Containers which contain themselves (cycles) are rendered as "key:<dict> <cycle>".
+    """
+    yield str(info_string)
+    if not isinstance(data, _CONTAINERS):
+        yield " " * indent + str(data)
+        return
+    path = {id(data)}  # Containers on the current path, for the cycle detection
+    # Frame: [items iterator, container, padding, depth, items rendered]
+    stack = [[_dict_items(data), data, " " * indent, 0, 0]]
+    while stack:
+        frame = stack[-1]
+        items, container, pad, depth = frame[0], frame[1], frame[2], frame[3]
+        nested = None
+        for label, value in items:
+            if max_items is not None and frame[4] >= max_items:
+                yield pad + "... <{} more>".format(len(container) - frame[4])
+                break
+            frame[4] += 1
+            if not isinstance(value, _CONTAINERS):
+                yield pad + label + ": " + str(value)
+                continue
+            header = pad + label + ":<" + type(value).__name__ + ">"
+            if id(value) in path:
+                yield header + " <cycle>"
+            elif max_depth is not None and depth >= max_depth:
+                yield header + " <...>"
+            else:
+                yield header
+                yield ""
+                nested = value
+                break
+        if nested is None:
+            stack.pop()
+            path.discard(id(container))
+        else:
+            path.add(id(nested))
+            stack.append([_dict_items(nested), nested, pad + "    ", depth + 1, 0])
+
+
+def render_dict(info_string, data, indent=0, max_depth=None, max_items=None):
+    """Returns print_dict output as a string"""
+    return "".join(line + "\n" for line in iter_dict_lines(info_string, data, indent, max_depth, max_items))
+
+
+def print_dict(info_string, data, indent=0, color=None, file=None, logger=None, max_depth=None, max_items=None,
+               chunk_lines=1000):
     """
     This function is used to print a dictionary in a structured way. It handles nested dictionaries, lists, tuples, sets, and frozensets.
-    It recursively prints the nested data structures with increased indentation.
+    It prints the nested data structures with increased indentation.
+    Lines are rendered iteratively (see iter_dict_lines) and written in chunks of chunk_lines lines.
 
     Parameters:
     info_string (str): The information string to be printed before the data structure.
     data (dict or list or tuple or set or frozenset): The data structure to be printed.
     indent (int): The indentation level for the current data structure. Default is 0.
     color (str): The color of the printed text. Default is None.
+    file: Stream to write to instead of sys.stdout (info string is not colored). Default is None.
+    logger (L): Logger to write to instead of sys.stdout, one record per chunk. The color selects the
+                L method: gprint, rprint, bprint, yprint or print. Default is None.
+    max_depth (int), max_items (int): see iter_dict_lines. Default is None.
+    chunk_lines (int): Lines per write (or log record). None - write everything at once. Default is 1000.
 
     Returns:
     None
     """
-    color_print = {
-        'g': gprint,
-        'r': rprint,
-        'b': bprint,
-        'y': yprint
-    }.get(color, print)
-
-    color_print(info_string)
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if not isinstance(value, (dict, list, tuple, set, frozenset)):
-                print(" " * indent + str(key) + ": " + str(value))
-            else:
-                print(" " * indent + str(key) + f":<{type(value).__name__}>")
-                print_dict("", value, indent + 4)
-    elif isinstance(data, (list, tuple, set, frozenset)):
-        for index, item in enumerate(data):
-            if not isinstance(item, (dict, list, tuple, set, frozenset)):
-                print(" " * indent + "[" + str(index) + "]: " + str(item))
-            else:
-                print(" " * indent + "[" + str(index) + "]:" + f"<{type(item).__name__}>" )
-                print_dict("", item, indent + 4)
+    lines = iter_dict_lines(info_string, data, indent, max_depth, max_items)
+    if logger is not None:
+        write = {
+            'g': logger.gprint,
+            'r': logger.rprint,
+            'b': logger.bprint,
+            'y': logger.yprint
+        }.get(color, logger.print)
+        line_end = ""
     else:
-        print(" " * indent + str(data))
+        stream = file or sys.stdout
+        write = stream.write
+        line_end = "\n"
+        color_string = {
+            'g': gstring,
+            'r': rstring,
+            'b': bstring,
+            'y': ystring
+        }.get(color)
+        first = next(lines)
+        lines = itertools.chain((color_string(first) if color_string and file is None else first,), lines)
+
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if chunk_lines and len(chunk) >= chunk_lines:
+            write("\n".join(chunk) + line_end)
+            chunk = []
+    if chunk:
+        write("\n".join(chunk) + line_end)
+
+
+PREFIX_EXCLUDES = frozenset(('dispatch', 'view', 'func_wrapper', 'wrapper', 'inner', '__init__', '__call__',
+                             'print_dict'))
+PREFIX_CACHE_SIZE = 1024
+_EVENT_LOOP_DIR = os.path.join(os.path.dirname(os.__file__), 'asyncio', '')
+_prefix_cache = OrderedDict()
+_prefix_cache_lock = Lock()
+
+
+def set_prefix_cache_size(size: int):
+    """Set the max number of cached call-site prefixes. Size 0 disables the cache"""
+    global PREFIX_CACHE_SIZE
+    with _prefix_cache_lock:
+        PREFIX_CACHE_SIZE = max(0, int(size))
+        while len(_prefix_cache) > PREFIX_CACHE_SIZE:
+            _prefix_cache.popitem(last=False)
+
+
+def clear_prefix_cache():
+    with _prefix_cache_lock:
+        _prefix_cache.clear()
+
+
+def _site_prefix(codes, owner=None, decorator=None) -> str:
+    """Prefix "[Owner.caller.function.decorator]  " of the code objects of the call site, innermost first"""
+    names = [code.co_name for code in reversed(codes)] or ['main']
+    if owner:
+        names.insert(0, owner if isinstance(owner, str) else owner.__name__)
+    if decorator:
+        names.append(decorator)
+    return '[{}]  '.format('.'.join(names))
+
+
+def call_site_prefix(depth: int = 2, count: int = 2, owner=None, decorator=None) -> str:
+    """
+    Cached call-site prefix: "[Owner.caller.function.decorator]  ".
+    Walks the stack starting <depth> frames above this function and collects <count> function names
+    (wrappers and recursive calls are skipped, same as logs_prefix does).
+    The prefix string is cached (LRU, PREFIX_CACHE_SIZE entries) by the owner, decorator and the code objects
+    of the collected frames, so a given call site builds its prefix string only once. The frames are still
+    walked on every call: the prefix depends on the callers of the call site, which the immediate frame
+    can't tell apart, so the cost grows with the number of the skipped wrappers.
+
+    Parameters:
+    depth (int): frame to start from, relative to this function frame
+    count (int): max number of function names in the prefix
+    owner (class or str): first item of the prefix (class of the instance or class name)
+    decorator (str): last item of the prefix
+    """
+    try:
+        frame = sys._getframe(depth)
+    except ValueError:
+        frame = None
+    # Code objects hash by value (expensive), so the key holds their ids. The cached entry keeps
+    # the code objects alive, so the ids can't be reused while the entry is in the cache.
+    key = [owner, decorator]
+    codes = []
+    memorized_name = None
+    while frame is not None and count:
+        code = frame.f_code
+        name = code.co_name
+        frame = frame.f_back
+        if name == memorized_name or name in PREFIX_EXCLUDES:
+            continue
+        if name == '<module>' or code.co_filename.startswith(_EVENT_LOOP_DIR):
+            break  # Module level or the asyncio event loop running the coroutine
+        memorized_name = name
+        key.append(id(code))
+        codes.append(code)
+        count -= 1
+    key = tuple(key)
+
+    entry = _prefix_cache.get(key)
+    if entry is not None:
+        try:
+            _prefix_cache.move_to_end(key)
+        except KeyError:
+            pass  # Evicted by another thread
+        return entry[0]
+
+    prefix = _site_prefix(codes, owner, decorator)
+    if PREFIX_CACHE_SIZE:
+        with _prefix_cache_lock:
+            _prefix_cache[key] = (prefix, codes)
+            while len(_prefix_cache) > PREFIX_CACHE_SIZE:
+                _prefix_cache.popitem(last=False)
+    return prefix
 
 
 def logs_prefix(*args, **kwargs):
-    _func_ = ''
+    """
+    logs_prefix(imax=3, i=1, cls=, self=, classname=, decorator=)
+    Returns "[Class.caller.function.decorator]  " prefix for the call site <i> frames above.
+    """
     if kwargs.get('cls'):
-        _func_ += '[{}.'.format(kwargs['cls'].__name__)
+        owner = kwargs['cls']
     elif kwargs.get('self'):
-        _func_ += '[{}.'.format(kwargs['self'].__class__.__name__)
+        owner = kwargs['self'].__class__
     elif kwargs.get('classname'):
-        _func_ += '[{}.'.format(kwargs['classname'])
+        owner = str(kwargs['classname'])
     else:
-        _func_ += '['
-
-    frames = []
+        owner = None
     i = 1 if not args or len(args) < 2 else args[1]
     imax = 3 if not args else args[0]
-    memorized_name = None
-    excludes = ('dispatch', 'view', 'func_wrapper', 'wrapper', 'inner', '__init__', '__call__')
-    while True:
-        try:
-            name = str(sys._getframe(i).f_code.co_name)
-        except ValueError:
-            break
-        if type(name).__name__ == 'NoneType' or name == memorized_name or name in excludes:
-            i += 1
-            imax += 1
-            continue
-        if name == '<module>' or i == imax:
-            break
-        memorized_name = name
-        frames.append(name)
-        i += 1
-    if not frames:
-        frames = ['main']
-    frames.reverse()
-
-    for name in frames:
-        _func_ += '{}.'.format(name)
-
-    if kwargs.get('decorator'):
-        _func_ += '{}]'.format(kwargs['decorator'])
-    else:
-        _func_ = _func_[:-1]
-        _func_ += "]"
-    offset = 2
-    _func_ = _func_ + ' ' * offset
-    return _func_
+    return call_site_prefix(i + 1, imax - i, owner=owner, decorator=kwargs.get('decorator') or None)
 
 
 def json_export():
     data = []
     project_file = '/export.json'
     export_file = open(project_file, 'w')
+    import json
     strLine = json.dumps(data)
     export_file.write(strLine)
 
 
-def get_choice(choices, mychoice, allow_revers: bool = True):
-    if not choices or choices.__class__.__name__ not in ('list', 'tuple', 'dict'):
-        return None
+def _scan_choices(choices, mychoice, allow_revers: bool = True):
+    """Linear lookup of get_choice (choices with unhashable items)"""
     for choice in choices:
         if choice[0] == mychoice:
             return choice[1]
@@ -243,6 +403,95 @@ def get_choice(choices, mychoice, allow_revers: bool = True):
     return None
 
 
+class ChoiceIndex(object):
+    """
+    Precomputed lookups of (value, label) choices: forward value -> label and reverse label -> value maps.
+    get() returns the same result as the linear scan of the choices: the first choice matching
+    by the value (returns the label) or by the label (returns the value, or the label if not allow_revers).
+    Dict choices are indexed by their items.
+    """
+
+    def __init__(self, choices):
+        if isinstance(choices, ChoiceIndex):
+            choices = choices.choices
+        self.choices = list(choices.items()) if isinstance(choices, dict) else list(choices)
+        self._forward = {}
+        self._reverse = {}
+        self._hashable = True
+        for position, choice in enumerate(self.choices):
+            value, label = choice[0], choice[1]
+            try:
+                if value not in self._forward:
+                    self._forward[value] = (position, label)
+                if label not in self._reverse:
+                    self._reverse[label] = (position, value, label)
+            except TypeError:
+                self._hashable = False  # Unhashable values or labels: linear scan
+
+    def __len__(self):
+        return len(self.choices)
+
+    def __iter__(self):
+        return iter(self.choices)
+
+    def get(self, mychoice, allow_revers: bool = True):
+        if not self._hashable:
+            return _scan_choices(self.choices, mychoice, allow_revers)
+        try:
+            forward = self._forward.get(mychoice)
+            reverse = self._reverse.get(mychoice)
+        except TypeError:
+            return _scan_choices(self.choices, mychoice, allow_revers)
+        if reverse is None or (forward is not None and forward[0] <= reverse[0]):
+            return forward[1] if forward is not None else None
+        return reverse[1] if allow_revers else reverse[2]
+
+
+CHOICE_INDEX_CACHE_SIZE = 256
+_choice_indexes = OrderedDict()
+_choice_indexes_lock = Lock()
+
+
+def choice_index(choices) -> ChoiceIndex:
+    """
+    Cached ChoiceIndex of the choices object (LRU, CHOICE_INDEX_CACHE_SIZE entries, by identity).
+    Choices are expected not to change after the first lookup: a list or dict whose length has changed
+    is re-indexed, other in-place changes are not detected (pass a new object or a ChoiceIndex).
+    """
+    if isinstance(choices, ChoiceIndex):
+        return choices
+    key = id(choices)
+    entry = _choice_indexes.get(key)
+    if entry is not None and entry[0] is choices and len(entry[1]) == len(choices):
+        try:
+            _choice_indexes.move_to_end(key)
+        except KeyError:
+            pass  # Evicted by another thread
+        return entry[1]
+    index = ChoiceIndex(choices)
+    if CHOICE_INDEX_CACHE_SIZE and hasattr(choices, '__len__'):
+        # The entry keeps the choices alive, so the id can't be reused while it's in the cache
+        with _choice_indexes_lock:
+            _choice_indexes[key] = (choices, index)
+            while len(_choice_indexes) > CHOICE_INDEX_CACHE_SIZE:
+                _choice_indexes.popitem(last=False)
+    return index
+
+
+def get_choice(choices, mychoice, allow_revers: bool = True):
+    """
+    Label of the value <mychoice>, or the value of the label <mychoice> (the label itself if not allow_revers).
+    choices: (value, label) pairs, dict or ChoiceIndex. Lookups go through the cached ChoiceIndex of the choices
+    """
+    if not choices or isinstance(choices, str):
+        return None
+    try:
+        index = choice_index(choices)
+    except (TypeError, IndexError, KeyError):
+        return None  # Not iterable or not (value, label) pairs
+    return index.get(mychoice, allow_revers)
+
+
 def get_index(mylist, value):
     for index, item in enumerate(mylist):
         if item == value:
@@ -267,29 +516,41 @@ def yesno(value):
         return None
 
 
+_switch_tables = {}  # Class -> (ON, OFF, on, off, {value.lower(): bool})
+
+
+def _switch_table(self):
+    """
+    (on, off, table) of the instance ON/OFF attributes (lower-cased, 'yes'/'no' if empty).
+    Cached per class, rebuilt when the ON/OFF attributes change
+    """
+    ON, OFF = getattr(self, 'ON'), getattr(self, 'OFF')
+    entry = _switch_tables.get(self.__class__)
+    if entry is None or entry[0] is not ON or entry[1] is not OFF:
+        on = ON.lower() if ON else 'yes'
+        off = OFF.lower() if OFF else 'no'
+        entry = _switch_tables[self.__class__] = (ON, OFF, on, off, {off: False, on: True})  # ON wins if equal
+    return entry[2], entry[3], entry[4]
+
+
 def switch(func):
     """
     Decorates set attribute functions:
     - Converts "ON"/"OFF" string value into Boolean values and
     - saves value into object attribute if attribute exists
     """
+    attr_name = func.__name__.replace('set_', '')
+
     def func_wrapper(self, value, **kwargs):
-        p = P(inst=self, decorator='switch', omit=True)
-        cls = self.__class__
-        ON = self.ON.lower() if getattr(self, 'ON') else 'yes'
-        OFF = self.OFF.lower() if getattr(self, 'OFF') else 'no'
-        attr_name = func.__name__.replace('set_', '')
-        if isinstance(value, bool):
-            pass
-        elif value.lower() == ON:
-            value = True
-        elif value.lower() == OFF:
-            value = False
-        else:
-            error = 'Error: wrong "switch" attribute (value = {}). {} or {} is expected.'
-            p.rprint(error.format(value, ON, OFF))
-            value = None
-        if attr_name in cls.__dict__.keys() and value is not None:
+        ON, OFF, table = _switch_table(self)
+        if not isinstance(value, bool):
+            switched = table.get(value.lower())
+            if switched is None:
+                p = shared_printer(inst=self, decorator='switch', omit=True)
+                error = 'Error: wrong "switch" attribute (value = {}). {} or {} is expected.'
+                p.rprint(error.format(value, ON, OFF))
+            value = switched
+        if value is not None and attr_name in self.__class__.__dict__:
             self.__setattr__(attr_name, value)
         return func(self, value, **kwargs)
     return func_wrapper
@@ -300,24 +561,21 @@ def switch2(func):
     Decorates set attribute functions:
     - Same as switch, but doesn't automatically saves values into object attribute.
     """
+    attr_name = func.__name__.replace('set_', '')
 
     def func_wrapper(self, value, **kwargs):
-        p = P(inst=self, decorator='switch', omit=True)
-        ON = self.ON.lower() if getattr(self, 'ON') else 'yes'
-        OFF = self.OFF.lower() if getattr(self, 'OFF') else 'no'
-        if isinstance(value, bool):
-            pass
-        elif value.lower() == ON:
-            value = True
-        elif value.lower() == OFF:
-            value = False
-        else:
-            error = 'Error: wrong "switch" attribute (value = {}). {} or {} is expected.'
-            p.rprint(error.format(value, ON, OFF))
-            return None
+        ON, OFF, table = _switch_table(self)
+        if not isinstance(value, bool):
+            switched = table.get(value.lower())
+            if switched is None:
+                p = shared_printer(inst=self, decorator='switch', omit=True)
+                error = 'Error: wrong "switch" attribute (value = {}). {} or {} is expected.'
+                p.rprint(error.format(value, ON, OFF))
+                return None
+            value = switched
 
         # Save attribute name for further processing by the stacked decorators (if any)
-        kwargs['_attr_name_'] = func.__name__.replace('set_', '')
+        kwargs['_attr_name_'] = attr_name
 
         return func(self, value, **kwargs)
 
@@ -329,17 +587,15 @@ def switch_reverse_yesno(func):
     Decorates get attribute functions:
     - Converts Boolean values into "ON"/"OFF" string values
     """
+    attr_name = func.__name__.replace('get_', '')
 
     def func_wrapper(self, **kwargs):
-        p = P(inst=self, decorator='switch_reverse_yesno', omit=True)
-        cls = self.__class__
-        ON = self.ON.lower() if getattr(self, 'ON') else 'yes'
-        OFF = self.OFF.lower() if getattr(self, 'OFF') else 'no'
-        attr_name = func.__name__.replace('get_', '')
+        ON, OFF, _ = _switch_table(self)
         value = func(self, **kwargs)
         if isinstance(value, bool):
             return ON if value else OFF
         else:
+            p = shared_printer(inst=self, decorator='switch_reverse_yesno', omit=True)
             p.rprint(f'Error: wrong "{attr_name}" switch attribute (value = {value}). Boolean is expected.')
             return None
 
@@ -347,7 +603,7 @@ def switch_reverse_yesno(func):
 
 
 def clean_select_field(self, choices, forms, error_message):
-    p = P(inst=self, omit=True)
+    p = shared_printer(inst=self, omit=True)
     _func_name_ = str(sys._getframe(1).f_code.co_name)
     if 'clean_' not in _func_name_:
         raise forms.ValidationError("Wrong procedure")
@@ -365,7 +621,7 @@ def clean_select_field(self, choices, forms, error_message):
 
 
 def clean_switch_field(self, forms, error_message):
-    p = P(inst=self, omit=True)
+    p = shared_printer(inst=self, omit=True)
     _func_name_ = str(sys._getframe(1).f_code.co_name)
     if 'clean_' not in _func_name_:
         raise forms.ValidationError("Wrong procedure")
@@ -382,17 +638,68 @@ def clean_switch_field(self, forms, error_message):
     return field
 
 
-def start_as_thread(func):
-    _func_ = logs_prefix()
+def start_as_thread(func=None, *, executor: str = 'default', max_workers: int = None, max_queue: int = None,
+                    mode: str = 'thread', logger=None):
+    """
+    Decorator: runs the function in a pooled worker thread (or process) and returns its Future.
+    Apply as @start_as_thread or @start_as_thread(executor='io', max_workers=8, max_queue=100).
 
-    def func_wrapper(*args, **kwargs):
-        if kwargs:
-            yprint(_func_ + ': starting {} as a thread'.format(func.__name__))
-            return Thread(target=func, args=args, kwargs=kwargs).start()
-        else:
-            yprint(_func_ + ': starting {} as a thread'.format(func.__name__))
-            return Thread(target=func, args=args).start()
-    return func_wrapper
+    Parameters:
+        executor: name of the shared executor (see pyquark.executors.get_executor). Executor parameters
+                  are taken from the first decorator which creates it. The default process pool is
+                  'default.process', other names run in one mode only (ValueError)
+        max_workers: pool size
+        max_queue: max tasks waiting for a worker: callers block when the queue is full (backpressure)
+        mode: 'thread' or 'process' (CPU bound work; module level functions only, picklable arguments)
+        logger: L to log starts and failures. Default: shared_logger()
+    """
+    def decorator(function):
+        _func_ = '[{}.start_as_thread]  '.format(function.__qualname__)  # call_site_prefix format
+        from pyquark.executors import PROCESS, call_wrapped, get_executor
+        target = function
+        if mode == PROCESS:
+            if '<locals>' in function.__qualname__:
+                raise ValueError(f"{function.__qualname__}: only module level functions run in a process pool")
+            target = functools.partial(call_wrapped, function.__module__, function.__qualname__)
+
+        def log():
+            nonlocal logger
+            if logger is None:
+                logger = shared_logger()  # Created on the first call, not on import
+            return logger
+
+        def failed(future):
+            if not future.cancelled() and future.exception() is not None:
+                log()._log(logging.ERROR, 'red', _func_,
+                         '{} failed: {!r}'.format(function.__name__, future.exception()))
+
+        @functools.wraps(function)
+        def func_wrapper(*args, **kwargs):
+            if log()._enabled(logging.DEBUG):
+                logger._log(logging.DEBUG, 'yellow', _func_, 'starting {} as a thread'.format(function.__name__))
+            future = get_executor(executor, max_workers, max_queue, mode).submit(target, *args, **kwargs)
+            future.add_done_callback(failed)
+            return future
+        return func_wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+class _SecondClock(object):
+    """Local time formatted with <fmt>, rendered once per second"""
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self._cache = (None, '')
+
+    def __call__(self) -> str:
+        second = int(time.time())
+        cache = self._cache
+        if cache[0] != second:
+            cache = self._cache = (second, time.strftime(self.fmt, time.localtime(second)))
+        return cache[1]
 
 
 class P(object):
@@ -400,6 +707,11 @@ class P(object):
     Class for colored print methods
     """
     FORMAT = '[{}] {}{}'
+    TIME_FORMAT = "%d/%b/%Y %H:%M:%S"
+    COLOURS = None  # None: colour only if sys.stdout is a TTY, True/False: always/never
+    _clock = _SecondClock(TIME_FORMAT)
+    _tty = (None, False)  # (stream, isatty) of the last stream written to
+    __slots__ = ('omit', 'omit_all', 'decorator', 'native', 'inst_class', '_prefix', '_middle')
 
     def __init__(self, **kwargs):
         """
@@ -427,37 +739,71 @@ class P(object):
         else:
             self.prefix = logs_prefix(4, 2, decorator=kwargs.get('decorator'))
 
+    @property
+    def prefix(self):
+        return self._prefix
+
+    @prefix.setter
+    def prefix(self, prefix):
+        # Line template is pre-joined: "[" + time + self._middle + str_line
+        self._prefix = prefix
+        self._middle = '] ' + prefix
 
+    @classmethod
+    def _colours(cls, stream) -> bool:
+        if cls.COLOURS is not None:
+            return cls.COLOURS
+        tty = P._tty
+        if tty[0] is not stream:
+            try:
+                tty = P._tty = (stream, stream.isatty())
+            except (AttributeError, ValueError):
+                tty = P._tty = (stream, False)
+        return tty[1]
+
+    def _write(self, colour, str_line, kwargs=None):
+        """Writes one line "[time] prefix str_line" to sys.stdout (print() if print kwargs are given)"""
+        line = '[' + self._clock() + self._middle + str(str_line)
+        if kwargs:
+            stream = kwargs.get('file') or sys.stdout
+            if colour is not None and self._colours(stream):
+                line = colour + line + Bcolors.ENDC
+            print(line, **kwargs)
+            return
+        stream = sys.stdout
+        if colour is not None and self._colours(stream):
+            stream.write(colour + line + Bcolors.ENDC + '\n')
+        else:
+            stream.write(line + '\n')
 
     def print(self, str_line, **kwargs):
         if self.omit:
             return
-        print(self.FORMAT.format(datetime.now().strftime("%d/%b/%Y %H:%M:%S"), self.prefix, str_line), **kwargs)
+        self._write(None, str_line, kwargs)
 
     def rprint(self, str_line, **kwargs):
-        rprint(self.FORMAT.format(datetime.now().strftime("%d/%b/%Y %H:%M:%S"), self.prefix, str_line))
+        self._write(Bcolors.RED, str_line)
 
     def yprint(self, str_line, **kwargs):
         if self.omit_all:
             return
-        yprint(self.FORMAT.format(datetime.now().strftime("%d/%b/%Y %H:%M:%S"), self.prefix, str_line), **kwargs)
+        self._write(Bcolors.WARNING, str_line, kwargs)
 
     def bprint(self, str_line, **kwargs):
         if self.omit_all:
             return
-        bprint(self.FORMAT.format(datetime.now().strftime("%d/%b/%Y %H:%M:%S"), self.prefix, str_line))
+        self._write(Bcolors.OKBLUE, str_line)
 
     def gprint(self, str_line, **kwargs):
         if self.omit_all:
             return
-        gprint(self.FORMAT.format(datetime.now().strftime("%d/%b/%Y %H:%M:%S"), self.prefix, str_line))
+        self._write(Bcolors.OKGREEN, str_line)
 
     def print_error(self, errors: dict):
-        prefix = '[{}] {}'.format(datetime.now().strftime("%d/%b/%Y %H:%M:%S"), self.prefix)
         for error_key, error_value in errors.items():
             if error_key not in ('error', 'source', 'params'):
                 continue
-            print_error("{}{}: {}".format(prefix, str(error_key).capitalize(), error_value))
+            self._write(Bcolors.FAIL, "{}: {}".format(str(error_key).capitalize(), error_value))
 
 
 class L(object):
@@ -467,10 +813,29 @@ class L(object):
 
     ERROR_FILE = "app_errors.log"
     APPLICATION_INDEX = ""
-    LOG_DIR = target_directory("logs")
+    LOG_DIR = _LazyClassAttribute(lambda: os.path.join(os.getcwd(), "logs"))  # Created with the first log file
     FORMAT = '{}{}'
     DEFAULT_LOGGER_NAME = 'pyquark.sys'
     LOG_FORMAT = logging.Formatter('[%(asctime)s] %(name)s: %(levelname)6s %(message)s', datefmt='%d/%b/%y %H:%M:%S')
+    CONSOLE_FORMAT = ColourFormatter('[%(asctime)s] %(name)s: %(levelname)6s %(message)s', datefmt='%d/%b/%y %H:%M:%S',
+                                     colours={'red': Bcolors.RED,
+                                              'orange': Bcolors.ORANGE,
+                                              'yellow': Bcolors.WARNING,
+                                              'blue': Bcolors.OKBLUE,
+                                              'green': Bcolors.OKGREEN,
+                                              'fail': Bcolors.FAIL},
+                                     reset=Bcolors.ENDC)
+    JSON_FORMAT = _LazyClassAttribute(JsonFormatter)
+    BACKGROUND_QUEUE_SIZE = 10000
+    BACKGROUND_OVERFLOW = BackgroundWriter.BLOCK  # block, drop_oldest or drop_newest
+    _background_writer = None
+    RATE_SUMMARY_INTERVAL = 5.0  # Seconds between the "last message repeated N times" records
+    _rate_limiters = {}  # Logger name -> RateLimiter
+    _samplers = {}  # Logger name -> Sampler of the DEBUG records
+    _recorders = {}  # Logger name -> FlightRecorder of the DEBUG records
+    __slots__ = ('omit', 'omit_all', 'debug', '_log_file_name', 'log_to_file', 'log_to_console', 'decorator', 'native',
+                 'inst_class', 'inst', '_prefix', 'structured', '_owner', '_threshold', '_levels_seen', '_limiter',
+                 '_sampler', '_recorder', '_stats', 'background', 'logger')
 
     def __init__(self, 
                  application: str = DEFAULT_LOGGER_NAME,
@@ -482,13 +847,41 @@ class L(object):
                  native: bool = False,
                  decorator: str = "",
                  init: bool = False,
-                 log_dir: str = LOG_DIR,
+                 log_dir: str = None,
+                 background=False,
+                 collector=None,
+                 structured: bool = False,
+                 compress: str = None,
+                 rate_limit: float = None,
+                 rate_burst: int = None,
+                 rate_limit_by: str = SITE,
+                 sample_every: int = None,
+                 sample_target: float = None,
+                 flight_recorder: int = None,
+                 flight_dump: int = None,
+                 instrument: bool = False,
                  **kwargs):
         """
         Parameters:
             omit: skips regular print, but allows all colored print methods
             omit_all: skips all prints methods except rprint
             prefix: controls if data+method name to be added to prefix
+            background: True - console and file records are written by the shared background writer thread
+                        (see BACKGROUND_QUEUE_SIZE and BACKGROUND_OVERFLOW), or a BackgroundWriter instance to use.
+                        Applies when the logger handlers are created.
+            collector: LogCollector (or its address) to send the file records to, instead of writing the log file
+                       in this process. Use collector_authkey=<bytes> with the address of the collector with authkey.
+            structured: write the log file as JSON lines (JSON_FORMAT). Keyword arguments of the xprint methods
+                        are written as extra record fields: log.gprint("Saved", user=user_id, size=size)
+            compress: 'gzip' or 'lzma' - rotated log files are compressed by a background thread
+            rate_limit: records per second allowed per call site (rate_limit_by='site') or per message
+                        (rate_limit_by='template') of the logger, rate_burst: records allowed at once.
+                        See set_rate_limit()
+            sample_every, sample_target: sampling of the DEBUG records (print, yprint, bprint). See set_sampling()
+            flight_recorder: size of the ring buffer of the DEBUG records which are not logged, flight_dump:
+                             records written to the log file on rprint/print_error. See set_flight_recorder()
+            instrument: count the records, bytes written and the time spent in the prefix and the handlers.
+                        See set_instrumentation()
         """
         self.omit = omit if not omit_all else omit_all
         self.omit_all = omit_all
@@ -501,73 +894,341 @@ class L(object):
         self.inst_class = kwargs.get('cls')
         self.inst = kwargs.get('inst')
         self._prefix = ''
-
-        # if native:
-        #     self._prefix = ''
-        # elif kwargs.get('inst'):
-        #     self._prefix = logs_prefix(4, 2, self=kwargs['inst'], decorator=decorator)
-        # elif kwargs.get('cls'):
-        #     self._prefix = logs_prefix(4, 2, cls=kwargs['cls'], decorator=decorator)
-        # else:
-        #     self._prefix = logs_prefix(4, 2, decorator=decorator)
+        self.structured = structured
+        if self.inst:
+            self._owner = self.inst.__class__.__name__
+        elif self.inst_class:
+            self._owner = getattr(self.inst_class, '__name__', str(self.inst_class))
+        else:
+            self._owner = ''
+        self._threshold = logging.DEBUG
+        self._levels_seen = -1  # LevelWatch generation the threshold was computed for
+        self._limiter = None
+        self._sampler = None
+        self._recorder = None
+        self._stats = None
+        if isinstance(background, BackgroundWriter):
+            self.background = background
+        else:
+            self.background = self.background_writer() if background else None
 
         logger_name = f"{application}_{self.app_index()}" if self.app_index() else application
-        con_logger_name = f"{logger_name}_"
 
-        """ Define console logger: 
-                Note: We are using separate loggers for console and file modes to allow colored records in console.
-                Effectively we are sending a colored record to console logger and plain log record to the file logger.
+        """ Define logger:
+                Note: A single logger serves console and file. Each record carries a semantic "colour" attribute,
+                the console handler formatter (CONSOLE_FORMAT) colours the message and the file handler
+                formatter (LOG_FORMAT) writes a plain one.
         """
-        if con_logger_name in logging.Logger.manager.loggerDict.keys() and not init:
-            self.con_logger = logging.getLogger(con_logger_name)
-        elif self.log_to_console:
-            self.con_logger = logging.getLogger(con_logger_name)
-            self.con_logger.setLevel(logging.DEBUG)  # Set's the root level for the logger. Handler can overwrite it
+        registered = logger_name in logging.Logger.manager.loggerDict.keys() and not init
+        if registered or self.log_to_console or self.log_to_file:
+            self.logger = logging.getLogger(logger_name)
+            if not registered:
+                self.logger.setLevel(logging.DEBUG)  # Set's the root level for the logger. Handler can overwrite it
+        else:
+            self.logger = None
+        console_handler, file_handler = self._handlers()
+
+        if self.log_to_console and (not registered or console_handler is None):
             """ Console handler """
             con_handler_level = logging.DEBUG if self.debug else logging.INFO
-            log_con_handler = logging.StreamHandler()
-            log_con_handler.setFormatter(self.log_format)
+            log_con_handler = ConsoleHandler()
+            log_con_handler.setFormatter(self.CONSOLE_FORMAT)
             log_con_handler.setLevel(con_handler_level)  # NOTSET(0),DEBUG(10),INFO(20),WARNING(30),ERROR(40),CRITICAL(50)
-            self.con_logger.addHandler(log_con_handler)
-        else:
-            self.con_logger = None
+            self.logger.addHandler(self._background(log_con_handler))
 
-        """Define file logger"""
-
-        if logger_name in logging.Logger.manager.loggerDict.keys() and not init:
-            self.logger = logging.getLogger(logger_name)
-        elif self.log_to_file:
-            self.logger = logging.getLogger(logger_name)
-            self.logger.setLevel(logging.DEBUG)  # Set's the root level for the logger. Handler can overwrite it
+        if self.log_to_file and (not registered or file_handler is None):
             """ File handler """
             handler_level = logging.DEBUG if self.debug else logging.INFO
-            self._log_file_name = f"{log_dir}/{logger_name.lower()}.log"
-            log_file_handler = logging.handlers.TimedRotatingFileHandler(filename=self._log_file_name,
-                                                                         when='midnight',
-                                                                         backupCount=30)
-            log_file_handler.setFormatter(self.log_format)
+            if collector is not None:
+                # Records are written by the collector process
+                from pyquark.collector import CollectorHandler
+                log_file_handler = CollectorHandler(address=getattr(collector, 'address', collector),
+                                                    authkey=getattr(collector, 'authkey',
+                                                                    kwargs.get('collector_authkey')))
+            else:
+                from pyquark.rotation import RotatingFileHandler
+                log_dir = log_dir or self.LOG_DIR
+                os.makedirs(log_dir, exist_ok=True)
+                self._log_file_name = f"{log_dir}/{logger_name.lower()}.log"
+                log_file_handler = RotatingFileHandler(filename=self._log_file_name, when='midnight', backupCount=30,
+                                                       compress=compress)
+                log_file_handler.setFormatter(self.JSON_FORMAT if structured else self.log_format)
             log_file_handler.setLevel(handler_level)  # DEBUG, INFO, WARNING, ERROR, CRITICAL
-            self.logger.addHandler(log_file_handler)
+            self.logger.addHandler(self._background(log_file_handler))
+
+        self.invalidate_levels()  # Handlers might be added to the logger shared with other instances
+        if rate_limit:
+            self.set_rate_limit(rate_limit, rate_burst, rate_limit_by)
+        if sample_every or sample_target:
+            self.set_sampling(sample_every or 1, sample_target)
+        if flight_recorder:
+            self.set_flight_recorder(flight_recorder, flight_dump)
+        if instrument:
+            self.set_instrumentation()
+
+    @classmethod
+    def invalidate_levels(cls):
+        """
+        Makes all L instances re-read the levels of their handlers.
+        Handlers created by L do it on setLevel(). Call it after adding/removing handlers
+        or changing levels of the other handlers (e.g. the root logger ones).
+        """
+        LevelWatch.generation += 1
+
+    def _refresh_levels(self):
+        self._levels_seen = LevelWatch.generation
+        threshold = logging.CRITICAL + 1
+        logger = self.logger
+        if logger is not None and not logger.disabled:
+            found = False
+            while logger:
+                for handler in logger.handlers:
+                    found = True
+                    threshold = min(threshold, handler.level)
+                if not logger.propagate:
+                    break
+                logger = logger.parent
+            if not found and logging.lastResort:
+                threshold = min(threshold, logging.lastResort.level)
+        self._threshold = threshold
+        self._limiter = L._rate_limiters.get(self.logger.name) if self.logger is not None else None
+        self._sampler = L._samplers.get(self.logger.name) if self.logger is not None else None
+        self._recorder = L._recorders.get(self.logger.name) if self.logger is not None else None
+        self._stats = STATS.get(self.logger.name) if self.logger is not None else None
+        if self._stats is not None:
+            self._stats.attach(self.logger.handlers)  # Handlers added since the instrumentation was set
+
+    def _enabled(self, level):
+        """Cheap check if any handler accepts the level. Checked before any formatting work"""
+        if self._levels_seen != LevelWatch.generation:
+            self._refresh_levels()
+        if level >= self._threshold:
+            return True
+        if self._stats is not None:
+            self._stats.filtered(level)
+        return False
+
+    def set_debug(self, debug: bool):
+        """Switches console and file handlers between DEBUG and INFO levels"""
+        self.debug = debug
+        if self.logger:
+            for handler in self.logger.handlers:
+                handler.setLevel(logging.DEBUG if debug else logging.INFO)
+        self.invalidate_levels()
+
+    def set_rate_limit(self, rate: float = None, burst: int = None, by: str = SITE, interval: float = None):
+        """
+        Token bucket rate limiting of the logger (shared by all L instances of the logger).
+        Records over <rate> per second (<burst> at once) of a call site (by='site') or of a message (by='template')
+        are dropped before the message and prefix evaluation. Their number is logged as
+        "last message repeated N times" every <interval> seconds (RATE_SUMMARY_INTERVAL).
+        rate=None removes the limit.
+        """
+        if self.logger is None:
+            return
+        limiter = L._rate_limiters.pop(self.logger.name, None)
+        if limiter is not None:
+            limiter.stop()
+        if rate:
+            L._rate_limiters[self.logger.name] = RateLimiter(rate, burst, by,
+                                                             interval or self.RATE_SUMMARY_INTERVAL)
+        self.invalidate_levels()
+
+    def set_sampling(self, every: int = 1, target: float = None, window: float = 1.0):
+        """
+        Sampling of the DEBUG records of the logger (shared by all L instances of the logger):
+        1 of every <every> records is logged. target: records per second - N is raised while more are logged.
+        Records sampled out skip the message evaluation and prefix. every=1 without target removes sampling.
+        """
+        if self.logger is None:
+            return
+        if every > 1 or target:
+            L._samplers[self.logger.name] = Sampler(every, target, window)
         else:
-            self.logger = None
+            L._samplers.pop(self.logger.name, None)
+        self.invalidate_levels()
+
+    def set_flight_recorder(self, size: int = 1000, dump_last: int = None):
+        """
+        Flight recorder of the logger (shared by all L instances of the logger): the last <size> DEBUG records
+        which are not logged (debug=False) are kept in memory, unformatted. rprint and print_error write
+        the last <dump_last> of them to the log file (console if there is no file) before the error.
+        size=None removes the recorder.
+        """
+        if self.logger is None:
+            return
+        if size:
+            L._recorders[self.logger.name] = FlightRecorder(size, dump_last)
+        else:
+            L._recorders.pop(self.logger.name, None)
+        self.invalidate_levels()
+
+    def set_instrumentation(self, enabled: bool = True):
+        """
+        Instrumentation of the logger (shared by all L instances of the logger): records emitted and filtered
+        (by level) per level, time spent in the prefix computation and, per handler, records, bytes written
+        and emit time. Counted in per-thread accumulators. Read with stats() or pyquark.instrument.STATS
+        (snapshot, export, start_export for the periodic logging).
+        """
+        if self.logger is None:
+            return
+        name = self.logger.name
+        if enabled:
+            stats = STATS.add(name)
+            stats.sources = [functools.partial(L._throttle_stats, name)]
+            stats.attach(self.logger.handlers)
+        else:
+            stats = STATS.remove(name)
+            if stats is not None:
+                stats.detach(self.logger.handlers)
+        self.invalidate_levels()
+
+    @staticmethod
+    def _throttle_stats(name) -> dict:
+        sampler, limiter = L._samplers.get(name), L._rate_limiters.get(name)
+        return {'sampled_out': sampler.dropped if sampler is not None else 0,
+                'suppressed': limiter.suppressed if limiter is not None else 0}
+
+    def stats(self) -> dict:
+        """Instrumentation snapshot of the logger (empty if it's not instrumented)"""
+        stats = STATS.get(self.logger.name) if self.logger is not None else None
+        return stats.snapshot() if stats is not None else {}
+
+    def _record(self, colour, str_line):
+        """
+        Flight recorder append. Only the code of the calling function is kept (no stack walk): the dumped records
+        have the "[Owner.function.decorator]" prefix ("[main]" at module level, as call_site_prefix).
+        Frames: _record -> xprint method -> caller
+        """
+        if self.native:
+            site = ''
+        else:
+            code = sys._getframe(2).f_code
+            site = (() if code.co_name == '<module>' else (code,),
+                    self.inst.__class__ if self.inst else self.inst_class, self.decorator or None)
+        self._recorder.append(colour, site, str_line)
+
+    @staticmethod
+    def _recorded_prefix(site) -> str:
+        return site if isinstance(site, str) else _site_prefix(*site)
+
+    def dump_flight_recorder(self) -> int:
+        """Writes the recorded DEBUG records to the log file. Returns their number"""
+        if self._levels_seen != LevelWatch.generation:
+            self._refresh_levels()
+        if self._recorder is None or not len(self._recorder):
+            return 0
+        console_handler, file_handler = self._handlers()
+        handler = file_handler or console_handler
+        return self._recorder.dump(self, handler, self._recorded_prefix) if handler is not None else 0
+
+    def sampling_stats(self) -> dict:
+        """{'seen', 'kept', 'dropped', 'every', 'scale'} of the DEBUG records sampling (empty if off)"""
+        if self._levels_seen != LevelWatch.generation:
+            self._refresh_levels()
+        return self._sampler.stats() if self._sampler is not None else {}
+
+    @property
+    def sampled_out_records(self):
+        """Number of DEBUG records dropped by sampling"""
+        return self.sampling_stats().get('dropped', 0)
+
+    @property
+    def suppressed_records(self):
+        """Number of records dropped by the rate limiter of the logger"""
+        if self._levels_seen != LevelWatch.generation:
+            self._refresh_levels()
+        return self._limiter.suppressed if self._limiter is not None else 0
+
+    def _allowed(self, level, colour, str_line=None):
+        """Rate limiter check. Frames: _allowed -> xprint method -> caller"""
+        limiter = self._limiter
+        if limiter.by == TEMPLATE and str_line is not None:
+            if isinstance(str_line, str):
+                return limiter.allow(str_line, str_line, level, colour, self)
+            code = getattr(str_line, '__code__', None)  # Lazy message: the callable code is the template
+            if code is not None:
+                return limiter.allow(id(code), code, level, colour, self)
+        frame = sys._getframe(2)
+        return limiter.allow((id(frame.f_code), frame.f_lineno), frame.f_code, level, colour, self)
+
+    def _limit_prefix(self) -> str:
+        """
+        Prefix of the call site of a new rate limit key, same as the records of the site have.
+        Frames: call_site_prefix -> _limit_prefix -> RateLimiter.allow -> _allowed -> xprint method -> caller
+        """
+        if self.native:
+            return ''
+        return call_site_prefix(5, 2, owner=self.inst.__class__ if self.inst else self.inst_class,
+                                decorator=self.decorator or None)
+
+    def _handlers(self):
+        """Returns (console handler, file handler) of the logger, None if not attached"""
+        console_handler = file_handler = None
+        for handler in (self.logger.handlers if self.logger else ()):
+            target = getattr(handler, 'target', handler)
+            if isinstance(target, logging.FileHandler):
+                file_handler = file_handler or handler
+            elif isinstance(target, logging.StreamHandler):
+                console_handler = console_handler or handler
+        return console_handler, file_handler
+
+    @property
+    def con_logger(self):
+        """Console and file records go through the same logger (kept for compatibility)"""
+        return self.logger
 
     @property
     def prefix(self):
+        # Frames: call_site_prefix -> prefix -> xprint method -> caller
+        stats = self._stats
+        start = time.perf_counter_ns() if stats is not None else 0
+        # Computed per call, not stored: one L (e.g. a shared_logger() facade) is used by many threads
         if self.native:
-            self._prefix = ''
+            prefix = ''
         elif self.inst:
-            self._prefix = logs_prefix(5, 3, self=self.inst, decorator=self.decorator)
+            prefix = call_site_prefix(3, 2, owner=self.inst.__class__, decorator=self.decorator or None)
         elif self.inst_class:
-            self._prefix = logs_prefix(5, 3, cls=self.inst_class, decorator=self.decorator)
+            prefix = call_site_prefix(3, 2, owner=self.inst_class, decorator=self.decorator or None)
         else:
-            self._prefix = logs_prefix(5, 3, decorator=self.decorator)
+            prefix = call_site_prefix(3, 2, decorator=self.decorator or None)
+        if stats is not None:
+            stats.prefix_time(time.perf_counter_ns() - start)
 
-        return self._prefix
+        return prefix
 
     @property
     def log_format(self):
         return self.LOG_FORMAT
 
+    @classmethod
+    def background_writer(cls):
+        """Shared background writer (created on first use)"""
+        if L._background_writer is None:
+            L._background_writer = BackgroundWriter(maxsize=cls.BACKGROUND_QUEUE_SIZE,
+                                                    overflow=cls.BACKGROUND_OVERFLOW)
+        return L._background_writer
+
+    def _background(self, handler):
+        if self.background is None:
+            return handler
+        return BackgroundHandler(handler, self.background)
+
+    def flush(self, timeout: float = None):
+        """Wait until background records are written and flush the handlers"""
+        if self._limiter is not None:
+            self._limiter.flush()
+        if self.background is not None:
+            self.background.flush(timeout)
+        if self.logger:
+            for handler in self.logger.handlers:
+                handler.flush()
+
+    @property
+    def dropped_records(self):
+        """Number of records dropped by the background writer on queue overflow"""
+        return self.background.dropped if self.background is not None else 0
+
     @classmethod
     def app_index(cls):
         return cls.APPLICATION_INDEX
@@ -582,6 +1243,7 @@ class L(object):
             return self._log_file_name
         if self.logger:
             for handler in self.logger.handlers:
+                handler = getattr(handler, 'target', handler)
                 if handler.__dict__.get('baseFilename'):
                     self._log_file_name = handler.__dict__['baseFilename']
                     return self._log_file_name
@@ -589,126 +1251,280 @@ class L(object):
 
     def remove(self):
         # Terminate the logger
-        con_logger_name = self.con_logger.name
-        file_logger_name = self.logger.name
-
-        # Delete console logger
-        for handler in self.con_logger.handlers[:]:
-            self.con_logger.removeHandler(handler)
-        self.con_logger.disabled = True
+        logger_name = self.logger.name
+        # Shared per-logger state: pending rate limit summaries are written before the handlers go
+        limiter = L._rate_limiters.pop(logger_name, None)
+        if limiter is not None:
+            limiter.stop()
+        L._samplers.pop(logger_name, None)
+        L._recorders.pop(logger_name, None)
 
-        # Delete file logger
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
         self.logger.disabled = True
 
         # Finally unregister from the manager
-        logging.Logger.manager.loggerDict.pop(con_logger_name, None)
-        logging.Logger.manager.loggerDict.pop(file_logger_name, None)
+        logging.Logger.manager.loggerDict.pop(logger_name, None)
+        STATS.remove(logger_name)
+        self.invalidate_levels()
 
         # Check if logger exists in the manager
-        if con_logger_name in logging.Logger.manager.loggerDict.keys():
-            print(f"CONSOLE LOGGER STILL EXISTS: {con_logger_name}")
+        if logger_name in logging.Logger.manager.loggerDict.keys():
+            print(f"LOGGER STILL EXISTS: {logger_name}")
         else:
-            print(f"CONSOLE LOGGER WAS REMOVED SUCCESSFULLY: {con_logger_name}")
+            print(f"LOGGER WAS REMOVED SUCCESSFULLY: {logger_name}")
 
+    def _log(self, level, colour, prefix, str_line, fields=None):
+        """
+        Sends a single record to the console and file handlers.
+        colour: semantic colour of the console record
+        fields: extra record fields (written by the structured output)
+        """
+        logger = self.logger
+        if logger.isEnabledFor(level):
+            if self._stats is not None:
+                self._stats.emitted(level)
+            # Prefix is already in the message: skip the caller lookup done by logging
+            record = logger.makeRecord(logger.name, level, "(unknown file)", 0, self.FORMAT.format(prefix, str_line),
+                                       None, None)
+            record.colour = colour
+            record.prefix = prefix
+            record.owner = self._owner
+            record.decorator = self.decorator
+            record.text = str_line
+            record.fields = fields
+            logger.handle(record)
 
     def print(self, str_line, **kwargs):
         if self.omit:
             return
+        if not self._enabled(logging.DEBUG):
+            if self._recorder is not None:
+                self._record(None, str_line)
+            return
+        if self._sampler is not None and not self._sampler.allow():
+            return
+        if self._limiter is not None and not self._allowed(logging.DEBUG, None, str_line):
+            return
 
         # Evaluate str_line only if needed, assuming str_line could be a callable
         if callable(str_line):
             str_line = str_line()  # Evaluate only when required
 
-        if self.logger:
-            self.logger.debug(self.FORMAT.format(self.prefix, str_line))
-        if self.con_logger:
-            self.con_logger.debug(self.FORMAT.format(self.prefix, str_line))
+        self._log(logging.DEBUG, None, self.prefix, str_line, kwargs)
 
     def rprint(self, str_line, **kwargs):
-        if self.logger:
-            self.logger.error(self.FORMAT.format(self.prefix, str_line))
-        if self.con_logger:
-            str_line = rstring(self.FORMAT.format(self.prefix, str_line))
-            self.con_logger.error(str_line)
+        if not self._enabled(logging.ERROR):
+            return
+        if self._limiter is not None and not self._allowed(logging.ERROR, 'red', str_line):
+            return
+        if self._recorder is not None and len(self._recorder):
+            self.dump_flight_recorder()
+
+        if callable(str_line):
+            str_line = str_line()
+
+        self._log(logging.ERROR, 'red', self.prefix, str_line, kwargs)
 
     def oprint(self, str_line, **kwargs):
         """Warning print"""
-        if self.omit_all:
+        if self.omit_all or not self._enabled(logging.WARNING):
+            return
+        if self._limiter is not None and not self._allowed(logging.WARNING, 'orange', str_line):
             return
 
-        if self.logger:
-            self.logger.warning(self.FORMAT.format(self.prefix, str_line))
-        if self.con_logger:
-            str_line = ostring(self.FORMAT.format(self.prefix, str_line))
-            self.con_logger.warning(str_line)
+        if callable(str_line):
+            str_line = str_line()
+
+        self._log(logging.WARNING, 'orange', self.prefix, str_line, kwargs)
 
     def yprint(self, str_line, **kwargs):
         if self.omit_all:
             return
+        if not self._enabled(logging.DEBUG):
+            if self._recorder is not None:
+                self._record('yellow', str_line)
+            return
+        if self._sampler is not None and not self._sampler.allow():
+            return
+        if self._limiter is not None and not self._allowed(logging.DEBUG, 'yellow', str_line):
+            return
 
         # Evaluate str_line only if needed, assuming str_line could be a callable
         if callable(str_line):
             str_line = str_line()  # Evaluate only when required
 
-        if self.logger:
-            self.logger.debug(self.FORMAT.format(self.prefix, str_line))
-        if self.con_logger:
-            str_line = ystring(self.FORMAT.format(self.prefix, str_line))
-            self.con_logger.debug(str_line)
+        self._log(logging.DEBUG, 'yellow', self.prefix, str_line, kwargs)
 
     def bprint(self, str_line, **kwargs):
         if self.omit_all:
             return
+        if not self._enabled(logging.DEBUG):
+            if self._recorder is not None:
+                self._record('blue', str_line)
+            return
+        if self._sampler is not None and not self._sampler.allow():
+            return
+        if self._limiter is not None and not self._allowed(logging.DEBUG, 'blue', str_line):
+            return
 
         # Evaluate str_line only if needed, assuming str_line could be a callable
         if callable(str_line):
             str_line = str_line()  # Evaluate only when required
 
-        if self.logger:
-            self.logger.debug(self.FORMAT.format(self.prefix, str_line))
-
-        if self.con_logger:
-            str_line = bstring(self.FORMAT.format(self.prefix, str_line))
-            self.con_logger.debug(str_line)
+        self._log(logging.DEBUG, 'blue', self.prefix, str_line, kwargs)
 
     def gprint(self, str_line, **kwargs):
-        if self.omit_all:
+        if self.omit_all or not self._enabled(logging.INFO):
+            return
+        if self._limiter is not None and not self._allowed(logging.INFO, 'green', str_line):
             return
 
         # Evaluate str_line only if needed, assuming str_line could be a callable
         if callable(str_line):
             str_line = str_line()  # Evaluate only when required
 
-        if self.logger:
-            self.logger.info(self.FORMAT.format(self.prefix, str_line))
-
-        if self.con_logger:
-            str_line = gstring(self.FORMAT.format(self.prefix, str_line))
-            self.con_logger.info(str_line)
-
-
+        self._log(logging.INFO, 'green', self.prefix, str_line, kwargs)
 
     def print_error(self, errors):
+        if not self._enabled(logging.CRITICAL):
+            return
+        if self._limiter is not None and not self._allowed(logging.CRITICAL, 'red'):
+            return
+        if self._recorder is not None and len(self._recorder):
+            self.dump_flight_recorder()
+        prefix = self.prefix
         if type(errors).__name__ == 'dict':
             for error_key, error_value in errors.items():
                 if error_key not in ('error', 'source', 'params'):
                     continue
-                if self.logger:
-                    self.logger.critical('{}{}: {}'.format(self.prefix, str(error_key).capitalize(), error_value))
-                if self.con_logger:
-                    str_line = error_string('{}{}: {}'.format(self.prefix, str(error_key).capitalize(), error_value))
-                    self.con_logger.critical(str_line)
+                self._log(logging.CRITICAL, 'fail', prefix, '{}: {}'.format(str(error_key).capitalize(), error_value))
+        else:
+            self._log(logging.CRITICAL, 'red', prefix, errors)
+
+
+class _SharedP(P):
+    """Immutable P of shared_printer(): the prefix of the calling function is resolved at print time"""
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner, decorator, omit, omit_all, native):
+        init = object.__setattr__
+        init(self, '_owner', owner)
+        init(self, 'inst_class', owner or '')
+        init(self, 'decorator', decorator)
+        init(self, 'omit', omit or omit_all)
+        init(self, 'omit_all', omit_all)
+        init(self, 'native', native)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Shared P can't be changed ({name!r}): create P() instead")
+
+    @property
+    def prefix(self):
+        # Frames: call_site_prefix -> prefix -> caller
+        return '' if self.native else call_site_prefix(2, 2, owner=self._owner, decorator=self.decorator)
+
+    @property
+    def _middle(self):
+        # Frames: call_site_prefix -> _middle -> _write -> xprint method -> caller
+        return '] ' + ('' if self.native else call_site_prefix(4, 2, owner=self._owner, decorator=self.decorator))
+
+
+class _SharedL(L):
+    """L of shared_logger(): the attributes the facade is shared by can't be changed"""
+    __slots__ = ()
+    _FROZEN = frozenset(('omit', 'omit_all', 'decorator', 'native', 'inst', 'inst_class', '_owner', 'logger',
+                         '_prefix'))
+
+    def __setattr__(self, name, value):
+        if name in self._FROZEN and hasattr(self, name):
+            raise AttributeError(f"Shared L can't be changed ({name!r}): create L() instead")
+        object.__setattr__(self, name, value)
+
+
+_shared_printers = {}  # (owner, decorator, omit, omit_all, native) -> _SharedP
+_shared_loggers = {}  # (owner, L arguments) -> _SharedL
+_shared_lock = Lock()
+
+
+def shared_printer(inst=None, cls=None, decorator: str = None, omit: bool = False, omit_all: bool = False,
+                   native: bool = False) -> P:
+    """
+    Flyweight of P(inst=, cls=, decorator=, omit=, omit_all=, native=) for the hot functions: prints the same,
+    but the instance is created once and shared by all the callers with the same owner class, decorator and flags.
+    The facade is immutable, the "[Class.caller.function]" prefix is resolved when a line is printed
+    (cached by call_site_prefix), so a call costs a dict lookup instead of a P construction.
+    """
+    owner = inst.__class__ if inst else cls or None
+    key = (owner, decorator or None, bool(omit), bool(omit_all), bool(native))
+    printer = _shared_printers.get(key)
+    if printer is None:
+        with _shared_lock:
+            printer = _shared_printers.get(key)
+            if printer is None:
+                printer = _shared_printers[key] = _SharedP(*key)
+    return printer
+
+
+def shared_logger(inst=None, cls=None, **kwargs) -> L:
+    """
+    Flyweight of L(inst=, cls=, **kwargs): created once per owner class and arguments (application, decorator,
+    flags, ...; the values must be hashable), shared after that. The prefix is resolved per record, as L does.
+    """
+    owner = inst.__class__ if inst else cls or None
+    key = (owner, tuple(kwargs.items()))  # Call order, not sorted: the same at a given call site
+    logger = _shared_loggers.get(key)
+    if logger is None:
+        with _shared_lock:
+            logger = _shared_loggers.get(key)
+            if logger is None:
+                logger = _shared_loggers[key] = _SharedL(cls=owner, **kwargs)
+    return logger
+
+
+def clear_shared():
+    """Drops the shared_printer() and shared_logger() facades (loggers and their handlers stay registered)"""
+    with _shared_lock:
+        _shared_printers.clear()
+        _shared_loggers.clear()
+
+
+SLUGIFY_CACHE_SIZE = 4096
+_SLUG_STRIP = re.compile(r'[^\w\s-]')
+_SLUG_SEPARATORS = re.compile(r'[-\s]+')
+# ASCII fast path: characters removed by _SLUG_STRIP are deleted, whitespace becomes a dash
+_SLUG_ASCII_TABLE = str.maketrans(
+    {c: None if not (c.isalnum() or c in '_-' or c.isspace()) else '-' if c.isspace() else c
+     for c in map(chr, range(128))})
+
+
+def _slugify(value: str, allow_unicode: bool) -> str:
+    if value.isascii():
+        # ASCII is not changed by the normalization. Dash runs (and whitespace) become a single "_"
+        return '_'.join(filter(None, value.lower().translate(_SLUG_ASCII_TABLE).split('-'))).strip('-_')
+    else:
+        import unicodedata
+        if allow_unicode:
+            value = unicodedata.normalize('NFKC', value)
         else:
-            if self.logger:
-                self.logger.critical(self.FORMAT.format(self.prefix, errors))
-            if self.con_logger:
-                str_line = rstring(self.FORMAT.format(self.prefix, errors))
-                self.con_logger.critical(str_line)
+            value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+        value = _SLUG_STRIP.sub('', value.lower())
+        return _SLUG_SEPARATORS.sub('_', value).strip('-_')
+
 
+_slugify_cached = functools.lru_cache(maxsize=SLUGIFY_CACHE_SIZE)(_slugify)
 
 
+def set_slugify_cache_size(size: int):
+    """Sets the max number of cached slugify results (0 disables the cache)"""
+    global SLUGIFY_CACHE_SIZE, _slugify_cached
+    SLUGIFY_CACHE_SIZE = size
+    _slugify_cached = functools.lru_cache(maxsize=size)(_slugify)
+
+
+def clear_slugify_cache():
+    _slugify_cached.cache_clear()
+
 
 def slugify(value, allow_unicode=False):
     """
@@ -717,17 +1533,21 @@ def slugify(value, allow_unicode=False):
     dashes to single dashes. Remove characters that aren't alphanumerics,
     underscores, or hyphens. Convert to lowercase. Also strip leading and
     trailing whitespace, dashes, and underscores.
+    Results are cached (SLUGIFY_CACHE_SIZE), ASCII input skips the Unicode normalization.
     """
-    value = str(value)
-    if allow_unicode:
-        value = unicodedata.normalize('NFKC', value)
-    else:
-        value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
-    value = re.sub(r'[^\w\s-]', '', value.lower())
-    return re.sub(r'[-\s]+', '_', value).strip('-_')
+    return _slugify_cached(str(value), bool(allow_unicode))
+
+
+def slugify_many(values, allow_unicode=False):
+    """Yields slugify() of each value of the iterable"""
+    cached = _slugify_cached
+    allow_unicode = bool(allow_unicode)
+    for value in values:
+        yield cached(str(value), allow_unicode)
 
 
 class Log(L):
+    __slots__ = ()
 
     def __init__(self,
                  application: str = L.DEFAULT_LOGGER_NAME,
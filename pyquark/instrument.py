@@ -0,0 +1,257 @@
+"""
+Runtime instrumentation of the L loggers: records emitted and filtered per level, time spent in the prefix
+computation and, per handler, records, bytes written and time spent in emit.
+
+Each thread updates its own accumulators (no locks on the hot path), snapshots merge them. Accumulators
+of the finished threads are folded into one (pyquark.metrics.ThreadShards).
+Handlers run by the background writer are measured in the writer thread.
+
+Usage:
+    log = L(application='service', log_to_file=True, instrument=True)   # or log.set_instrumentation()
+    STATS.snapshot()                # {'service': {'emitted': {'INFO': 10, ...}, 'handlers': {'file': ...}}}
+    STATS.start_export(60)          # logs the snapshots every minute
+"""
+import logging
+import threading
+
+from pyquark.metrics import ThreadShards
+
+
+class _Shard(object):
+    """Per-thread accumulator of a logger"""
+    __slots__ = ('emitted', 'filtered', 'prefix_calls', 'prefix_ns')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.emitted = {}
+        self.filtered = {}
+        self.prefix_calls = 0
+        self.prefix_ns = 0
+
+    def merge(self, other):
+        for totals, counts in ((self.emitted, other.emitted), (self.filtered, other.filtered)):
+            for level, count in list(counts.items()):
+                totals[level] = totals.get(level, 0) + count
+        self.prefix_calls += other.prefix_calls
+        self.prefix_ns += other.prefix_ns
+
+
+class _HandlerShard(object):
+    """Per-thread accumulator of a handler"""
+    __slots__ = ('records', 'bytes', 'emit_ns', 'max_ns')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.records = 0
+        self.bytes = 0
+        self.emit_ns = 0
+        self.max_ns = 0
+
+    def merge(self, other):
+        self.records += other.records
+        self.bytes += other.bytes
+        self.emit_ns += other.emit_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+
+class _Sharded(object):
+    shard_class = None
+
+    def __init__(self):
+        self._shards = ThreadShards(self.shard_class)
+        self.shard = self._shards.get  # Accumulator of the current thread
+        self.shards = self._shards.shards
+
+    def reset(self):
+        """Starts from zero (the accumulators are cleared in place: a concurrent update may be lost)"""
+        self._shards.reset()
+
+
+class HandlerStats(_Sharded):
+    """Records, bytes written (encoded with the stream encoding) and emit time of one handler"""
+    shard_class = _HandlerShard
+
+    def __init__(self, name: str):
+        super(HandlerStats, self).__init__()
+        self.name = name
+
+    def written(self, size: int):
+        self.shard().bytes += size
+
+    def emitted(self, elapsed: int):
+        shard = self.shard()
+        shard.records += 1
+        shard.emit_ns += elapsed
+        if elapsed > shard.max_ns:
+            shard.max_ns = elapsed
+
+    def snapshot(self) -> dict:
+        records = size = emit_ns = max_ns = 0
+        for shard in self.shards():
+            records += shard.records
+            size += shard.bytes
+            emit_ns += shard.emit_ns
+            max_ns = max(max_ns, shard.max_ns)
+        return {'records': records, 'bytes': size, 'emit_ms': emit_ns / 1e6,
+                'mean_emit_us': emit_ns / records / 1e3 if records else 0.0, 'max_emit_us': max_ns / 1e3}
+
+
+class LoggerStats(_Sharded):
+    """Counters of one logger (shared by all its L instances) and of its handlers"""
+    shard_class = _Shard
+
+    def __init__(self, name: str):
+        super(LoggerStats, self).__init__()
+        self.name = name
+        self.handlers = {}  # Name -> HandlerStats
+        self.sources = []  # Callables returning extra counters (sampler, rate limiter)
+
+    def attach(self, handlers):
+        """Instruments the handlers (targets of the background handlers) which are not instrumented yet"""
+        for handler in handlers:
+            target = getattr(handler, 'target', handler)
+            if getattr(target, 'stats', False) is not None:
+                continue  # Instrumented already or not a pyquark handler
+            if isinstance(target, logging.FileHandler):
+                name = 'file'
+            elif isinstance(target, logging.StreamHandler):
+                name = 'console'
+            else:
+                name = type(target).__name__
+            unique, index = name, 1
+            while unique in self.handlers:
+                index += 1
+                unique = f"{name}{index}"
+            target.stats = self.handlers[unique] = HandlerStats(unique)
+
+    def detach(self, handlers):
+        for handler in handlers:
+            target = getattr(handler, 'target', handler)
+            if getattr(target, 'stats', None) in self.handlers.values():
+                target.stats = None
+
+    def emitted(self, level: int):
+        emitted = self.shard().emitted
+        emitted[level] = emitted.get(level, 0) + 1
+
+    def filtered(self, level: int):
+        filtered = self.shard().filtered
+        filtered[level] = filtered.get(level, 0) + 1
+
+    def prefix_time(self, elapsed: int):
+        shard = self.shard()
+        shard.prefix_calls += 1
+        shard.prefix_ns += elapsed
+
+    def snapshot(self) -> dict:
+        emitted, filtered = {}, {}
+        prefix_calls = prefix_ns = 0
+        for shard in self.shards():
+            for totals, counts in ((emitted, shard.emitted), (filtered, shard.filtered)):
+                for level, count in list(counts.items()):
+                    name = logging.getLevelName(level)
+                    totals[name] = totals.get(name, 0) + count
+            prefix_calls += shard.prefix_calls
+            prefix_ns += shard.prefix_ns
+        snapshot = {
+            'records': sum(emitted.values()),
+            'emitted': emitted,
+            'filtered': filtered,
+            'prefix_calls': prefix_calls,
+            'prefix_ms': prefix_ns / 1e6,
+            'mean_prefix_us': prefix_ns / prefix_calls / 1e3 if prefix_calls else 0.0,
+            'handlers': {name: stats.snapshot() for name, stats in list(self.handlers.items())},
+        }
+        for source in self.sources:
+            snapshot.update(source())
+        return snapshot
+
+    def reset(self):
+        super(LoggerStats, self).reset()
+        for stats in list(self.handlers.values()):
+            stats.reset()
+
+
+class StatsRegistry(object):
+    """LoggerStats of the instrumented loggers with snapshot and export through an L logger"""
+
+    def __init__(self):
+        self._loggers = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+        self._stop_export = None
+
+    def get(self, name: str):
+        """LoggerStats of the logger or None if it's not instrumented"""
+        return self._loggers.get(name)
+
+    def add(self, name: str) -> LoggerStats:
+        with self._lock:
+            stats = self._loggers.get(name)
+            if stats is None:
+                stats = self._loggers[name] = LoggerStats(name)
+            return stats
+
+    def remove(self, name: str):
+        with self._lock:
+            return self._loggers.pop(name, None)
+
+    def names(self) -> list:
+        return sorted(self._loggers)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """{logger name: LoggerStats.snapshot()}"""
+        with self._lock:
+            loggers = list(self._loggers.values())
+        snapshot = {}
+        for stats in loggers:
+            snapshot[stats.name] = stats.snapshot()
+            if reset:
+                stats.reset()
+        return snapshot
+
+    def export(self, logger=None, reset: bool = False) -> dict:
+        """
+        Logs one INFO record per logger through the L logger (fields are passed to the structured output).
+        Default logger: shared_logger(application='pyquark.stats'). Returns the snapshot
+        """
+        if logger is None:
+            from pyquark.helper import shared_logger
+            logger = shared_logger(application='pyquark.stats')
+        snapshot = self.snapshot(reset=reset)
+        for name, stats in snapshot.items():
+            handlers = ' '.join("{}: {records} records {bytes} bytes {emit_ms:.3f}ms".format(handler, **values)
+                                for handler, values in stats['handlers'].items())
+            logger.gprint("{}: records={records} filtered={} prefix={prefix_ms:.3f}ms {}".format(
+                name, sum(stats['filtered'].values()), handlers, **stats), logger_stats=name, **stats)
+        return snapshot
+
+    def start_export(self, interval: float, logger=None, reset: bool = True):
+        """Exports the snapshots every <interval> seconds in a daemon thread (until stop_export)"""
+        self.stop_export()
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.export(logger, reset=reset)
+                except Exception:
+                    pass  # Instrumentation must not break the application
+
+        self._stop_export = stop
+        self._exporter = threading.Thread(target=run, name='pyquark.stats.export', daemon=True)
+        self._exporter.start()
+        return self._exporter
+
+    def stop_export(self):
+        if self._stop_export is not None:
+            self._stop_export.set()
+            self._exporter.join()
+            self._stop_export = self._exporter = None
+
+
+STATS = StatsRegistry()
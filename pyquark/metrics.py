@@ -0,0 +1,445 @@
+"""
+Low-overhead timing metrics.
+
+exec_time decorator feeds a MetricsRegistry instead of printing a line per call: per function it keeps
+the call and error counts and a log-linear (HDR-style) latency histogram with ~6% resolution.
+Each thread updates its own accumulator (no locks on the hot path); snapshots merge them. Accumulators of
+the finished threads are folded into one, so short-lived threads don't add up.
+With sample_rate < 1 only every N-th call is timed, the others are only counted.
+
+Usage:
+    @exec_time
+    def handler(request): ...
+
+    @exec_time(sample_rate=0.01, name='db.query')
+    async def query(sql): ...
+
+    REGISTRY.snapshot()                      # {'db.query': {'calls': ..., 'p99_ms': ...}, ...}
+    REGISTRY.export(log)                     # one record per function through the L logger
+    REGISTRY.start_export(60, log)           # every minute, in a daemon thread
+"""
+import functools
+import threading
+import time
+
+_SUB_BITS = 4  # 16 sub-buckets per power of two
+_SUB_COUNT = 1 << _SUB_BITS
+_LINEAR = _SUB_COUNT * 2  # Values below are counted exactly
+
+
+def _bucket(value: int) -> int:
+    """Histogram bucket of the value (ns)"""
+    if value < _LINEAR:
+        return value if value > 0 else 0
+    shift = value.bit_length() - _SUB_BITS - 1
+    return (shift << _SUB_BITS) + (value >> shift)
+
+
+def _bucket_value(index: int) -> int:
+    """Middle value of the histogram bucket"""
+    if index < _LINEAR:
+        return index
+    shift = (index >> _SUB_BITS) - 1
+    return ((index - (shift << _SUB_BITS)) << shift) + (1 << (shift - 1))
+
+
+class _Shard(object):
+    """Per-thread accumulator of a Timer"""
+    __slots__ = ('calls', 'errors', 'sampled', 'total', 'max', 'counts')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.errors = 0
+        self.sampled = 0
+        self.total = 0
+        self.max = 0
+        self.counts = [0] * (_LINEAR + 16 * _SUB_COUNT)  # Up to ~1 ms, grows for the slower calls
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.sampled += other.sampled
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        counts = self.counts
+        if len(other.counts) > len(counts):
+            counts.extend([0] * (len(other.counts) - len(counts)))
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+
+    def record(self, elapsed: int, error: bool):
+        if error:
+            self.errors += 1
+        self.sampled += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if elapsed < _LINEAR:  # _bucket() inlined
+            index = elapsed if elapsed > 0 else 0
+        else:
+            shift = elapsed.bit_length() - _SUB_BITS - 1
+            index = (shift << _SUB_BITS) + (elapsed >> shift)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+
+
+class ThreadShards(object):
+    """
+    Per-thread accumulators made by <factory> (objects with reset() and merge(other)).
+    Accumulators of the finished threads are merged into the retired one when shards() is called
+    and when new threads register (amortized), so their number follows the live threads.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.local = threading.local()  # .shard: accumulator of the current thread
+        self._lock = threading.Lock()
+        self._shards = []  # (thread, accumulator)
+        self._retired = factory()
+        self._prune_at = 64
+
+    def get(self):
+        """Accumulator of the current thread"""
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = self.factory()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._prune_at:
+                    self._prune()
+            return shard
+
+    def _prune(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retired.merge(shard)  # No more updates: the thread is done
+        self._shards = live
+        self._prune_at = max(64, 2 * len(live))
+
+    def shards(self) -> list:
+        """Retired accumulator and the ones of the live threads"""
+        with self._lock:
+            self._prune()
+            return [self._retired] + [shard for _, shard in self._shards]
+
+    def reset(self):
+        """Starts from zero (the accumulators are cleared in place: a concurrent update may be lost)"""
+        for shard in self.shards():
+            shard.reset()
+
+    def __len__(self):
+        return len(self._shards)
+
+
+class Timer(object):
+    """
+    Call count and latency histogram of one function.
+
+    Parameters:
+        name: metric name
+        sample_rate: share of the calls to time (1 - all, 0.01 - every 100-th)
+    """
+
+    def __init__(self, name: str, sample_rate: float = 1.0):
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"sample_rate must be in (0, 1], got {sample_rate!r}")
+        self.name = name
+        self.sample_rate = sample_rate
+        self.every = max(1, round(1 / sample_rate))
+        self._shards = ThreadShards(_Shard)
+        self._local = self._shards.local
+
+    def shard(self) -> _Shard:
+        """Accumulator of the current thread"""
+        return self._shards.get()
+
+    def reset(self):
+        """Starts from zero (the accumulators are cleared in place: a concurrent update may be lost)"""
+        self._shards.reset()
+
+    def percentile(self, counts, total: int, q: float) -> float:
+        """q-th percentile (0..1) in ms of the merged histogram"""
+        if not total:
+            return 0.0
+        rank = max(1, int(q * total + 0.5))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return _bucket_value(index) / 1e6
+        return 0.0
+
+    def snapshot(self) -> dict:
+        shards = self._shards.shards()
+        calls = errors = sampled = total = maximum = 0
+        counts = []
+        for shard in shards:
+            calls += shard.calls
+            errors += shard.errors
+            sampled += shard.sampled
+            total += shard.total
+            maximum = max(maximum, shard.max)
+            shard_counts = shard.counts
+            if len(shard_counts) > len(counts):
+                counts.extend([0] * (len(shard_counts) - len(counts)))
+            for index, count in enumerate(shard_counts):
+                if count:
+                    counts[index] += count
+        return {
+            'calls': calls,
+            'errors': errors,
+            'sampled': sampled,
+            'mean_ms': total / sampled / 1e6 if sampled else 0.0,
+            'p50_ms': self.percentile(counts, sampled, 0.50),
+            'p95_ms': self.percentile(counts, sampled, 0.95),
+            'p99_ms': self.percentile(counts, sampled, 0.99),
+            'max_ms': maximum / 1e6,
+        }
+
+    def __call__(self, func):
+        """Decorates sync or async function, generator or async generator"""
+        import inspect  # Lazy: imported with pyquark.helper (instrumentation)
+        if inspect.isasyncgenfunction(func):
+            wrapper = self._wrap_async_generator(func)
+        elif inspect.iscoroutinefunction(func):
+            wrapper = self._wrap_coroutine(func)
+        elif inspect.isgeneratorfunction(func):
+            wrapper = self._wrap_generator(func)
+        else:
+            wrapper = self._wrap_function(func)
+        wrapper = functools.wraps(func)(wrapper)
+        wrapper.timer = self
+        return wrapper
+
+    def _wrap_function(self, func):
+        every, local, shard, clock = self.every, self._local, self.shard, time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            try:
+                accumulator = local.shard
+            except AttributeError:
+                accumulator = shard()
+            accumulator.calls += 1
+            if accumulator.calls % every:
+                return func(*args, **kwargs)
+            error = True
+            start = clock()
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                accumulator.record(clock() - start, error)
+        return wrapper
+
+    def _wrap_coroutine(self, func):
+        every, local, shard, clock = self.every, self._local, self.shard, time.perf_counter_ns
+
+        async def wrapper(*args, **kwargs):
+            try:
+                accumulator = local.shard
+            except AttributeError:
+                accumulator = shard()
+            accumulator.calls += 1
+            if accumulator.calls % every:
+                return await func(*args, **kwargs)
+            error = True
+            start = clock()  # Wall time, including the time the coroutine waits
+            try:
+                result = await func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                accumulator.record(clock() - start, error)
+        return wrapper
+
+    def _wrap_generator(self, func):
+        every, local, shard, clock = self.every, self._local, self.shard, time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            try:
+                accumulator = local.shard
+            except AttributeError:
+                accumulator = shard()
+            accumulator.calls += 1
+            if accumulator.calls % every:
+                return (yield from func(*args, **kwargs))
+            # Time spent in the generator itself: the consumer time between the items is not counted
+            elapsed = 0
+            error = True
+            generator = func(*args, **kwargs)
+            resume, value = generator.send, None
+            try:
+                while True:
+                    start = clock()
+                    try:
+                        item = resume(value)
+                    except StopIteration as stop:
+                        elapsed += clock() - start
+                        error = False
+                        return stop.value
+                    elapsed += clock() - start
+                    try:
+                        value = yield item
+                        resume = generator.send
+                    except GeneratorExit:
+                        error = False
+                        generator.close()
+                        raise
+                    except BaseException as exc:
+                        resume, value = generator.throw, exc
+            finally:
+                accumulator.record(elapsed, error)
+        return wrapper
+
+    def _wrap_async_generator(self, func):
+        every, local, shard, clock = self.every, self._local, self.shard, time.perf_counter_ns
+
+        async def wrapper(*args, **kwargs):
+            try:
+                accumulator = local.shard
+            except AttributeError:
+                accumulator = shard()
+            accumulator.calls += 1
+            generator = func(*args, **kwargs)
+            timed = not accumulator.calls % every
+            elapsed = 0
+            error = True
+            resume, value = generator.asend, None
+            try:
+                while True:
+                    start = clock()
+                    try:
+                        item = await resume(value)
+                    except StopAsyncIteration:
+                        elapsed += clock() - start
+                        error = False
+                        return
+                    elapsed += clock() - start
+                    try:
+                        value = yield item
+                        resume = generator.asend
+                    except GeneratorExit:
+                        error = False
+                        await generator.aclose()
+                        raise
+                    except BaseException as exc:
+                        resume, value = generator.athrow, exc
+            finally:
+                if timed:
+                    accumulator.record(elapsed, error)
+        return wrapper
+
+
+class MetricsRegistry(object):
+    """Named Timers with snapshot and export through an L logger"""
+
+    def __init__(self):
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+        self._stop_export = None
+
+    def timer(self, name: str, sample_rate: float = 1.0) -> Timer:
+        """Timer of the name (created on the first use)"""
+        timer = self._timers.get(name)
+        if timer is None:
+            with self._lock:
+                timer = self._timers.get(name)
+                if timer is None:
+                    timer = self._timers[name] = Timer(name, sample_rate)
+        return timer
+
+    def __contains__(self, name):
+        return name in self._timers
+
+    def __getitem__(self, name) -> Timer:
+        return self._timers[name]
+
+    def names(self) -> list:
+        return sorted(self._timers)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """{name: {'calls', 'errors', 'sampled', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}}"""
+        with self._lock:
+            timers = list(self._timers.values())
+        snapshot = {}
+        for timer in timers:
+            snapshot[timer.name] = timer.snapshot()
+            if reset:
+                timer.reset()
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            timers = list(self._timers.values())
+        for timer in timers:
+            timer.reset()
+
+    def export(self, logger=None, reset: bool = False, skip_idle: bool = True) -> dict:
+        """
+        Logs one INFO record per function through the L logger (fields are passed to the structured output).
+        Default logger: shared_logger(application='pyquark.metrics'). Returns the snapshot
+        """
+        if logger is None:
+            from pyquark.helper import shared_logger
+            logger = shared_logger(application='pyquark.metrics')
+        snapshot = self.snapshot(reset=reset)
+        for name, stats in snapshot.items():
+            if skip_idle and not stats['calls']:
+                continue
+            logger.gprint("{}: calls={calls} errors={errors} mean={mean_ms:.3f}ms p50={p50_ms:.3f}ms "
+                          "p95={p95_ms:.3f}ms p99={p99_ms:.3f}ms max={max_ms:.3f}ms".format(name, **stats),
+                          metric=name, **stats)
+        return snapshot
+
+    def start_export(self, interval: float, logger=None, reset: bool = True):
+        """Exports the snapshots every <interval> seconds in a daemon thread (until stop_export)"""
+        self.stop_export()
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.export(logger, reset=reset)
+                except Exception:
+                    pass  # Metrics must not break the application
+
+        self._stop_export = stop
+        self._exporter = threading.Thread(target=run, name='pyquark.metrics.export', daemon=True)
+        self._exporter.start()
+        return self._exporter
+
+    def stop_export(self):
+        if self._stop_export is not None:
+            self._stop_export.set()
+            self._exporter.join()
+            self._stop_export = self._exporter = None
+
+
+REGISTRY = MetricsRegistry()
+
+
+def exec_time(func=None, *, name: str = None, sample_rate: float = 1.0, registry: MetricsRegistry = None):
+    """
+    Apply as decorator to any function or method to measure its exec time: @exec_time or
+    @exec_time(name='...', sample_rate=0.1). Results are in the registry (REGISTRY by default)
+    under the function qualified name.
+    """
+    def decorator(function):
+        timer = (registry or REGISTRY).timer(name or f"{function.__module__}.{function.__qualname__}", sample_rate)
+        return timer(function)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
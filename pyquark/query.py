@@ -0,0 +1,542 @@
+"""
+Time-indexed reader of the L log files (text LOG_FORMAT and structured JSON lines).
+
+Each log file gets a sidecar index "<log file>.idx" with the start offset, time, level and logger
+of every record. Queries bisect the index and read only the matching records through mmap.
+When the log file has grown since it was indexed, only the new tail is indexed.
+Rotated files compressed with gzip (.gz) or lzma (.xz) are indexed and read the same way (without mmap).
+
+Usage:
+    for record in query(L.LOG_DIR, start=datetime(2024, 12, 24, 10), end=datetime(2024, 12, 24, 11),
+                        level='WARNING', logger='pyquark.sys'):
+        print(record.time, record.levelname, record.message)
+
+Live tail across the midnight rotations (see LogFollower):
+    for record in follow(log, checkpoint_file='dashboard.checkpoint'):
+        print(record.time, record.levelname, record.message)
+"""
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+from pyquark.handlers import COMPRESSION_SUFFIXES, INDEX_SUFFIX
+
+_INDEX_MAGIC = b'PQIDX1\n'
+
+# [24/Dec/24 10:00:00] pyquark.sys:  DEBUG [Bcolors.main]  message
+_TEXT_RECORD = re.compile(rb'^\[(\d\d/\w{3}/\d\d \d\d:\d\d:\d\d)\] (.+?): +([A-Z]+) ')
+_TEXT_TIME_FORMAT = '%d/%b/%y %H:%M:%S'
+# {"ts":"2024-12-24T10:00:00.123","level":"DEBUG","logger":"pyquark.sys",...}
+_JSON_RECORD = re.compile(rb'^\{"ts":"([^"]+)","level":"([A-Z]+)","logger":("(?:[^"\\]|\\.)*")')
+_JSON_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+Record = namedtuple('Record', 'time levelname logger message raw path offset')
+
+
+def level_number(level) -> int:
+    """'WARNING' or logging.WARNING -> 30"""
+    if level is None:
+        return 0
+    if isinstance(level, int):
+        return level
+    number = logging.getLevelName(str(level).upper())
+    return number if isinstance(number, int) else 0
+
+
+def to_timestamp(value):
+    """datetime (local time if naive) or epoch seconds -> epoch seconds"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(tuple(COMPRESSION_SUFFIXES.values()))
+
+
+def open_log(path: str):
+    """Opens plain, gzip (.gz) or lzma (.xz) log file for binary reading"""
+    if path.endswith(COMPRESSION_SUFFIXES['gzip']):
+        import gzip
+        return gzip.open(path, 'rb')
+    if path.endswith(COMPRESSION_SUFFIXES['lzma']):
+        import lzma
+        return lzma.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _message(raw: bytes) -> str:
+    """Message of the record: text after the LOG_FORMAT header or the "message" of a JSON line"""
+    message = raw
+    if raw.startswith(b'{'):
+        try:
+            message = json.loads(raw).get('message', raw)
+        except ValueError:
+            pass
+    else:
+        match = _TEXT_RECORD.match(raw)
+        if match:
+            message = raw[match.end():]
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+    return message
+
+
+class LogIndex(object):
+    """
+    Sidecar index of one log file.
+
+    Parameters:
+        path: log file
+        index_path: sidecar index file. Default: <path>.idx
+    """
+
+    def __init__(self, path: str, index_path: str = None):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self.compressed = is_compressed(path)
+        self._reset()
+        self._load()
+
+    def _reset(self, inode=None):
+        self.inode = inode
+        self.size = 0  # Indexed bytes (up to the end of the last complete line)
+        self.times = array('d')
+        self.offsets = array('Q')
+        self.levels = array('B')
+        self.loggers = array('H')
+        self.logger_names = []
+        self._logger_ids = {}
+        self._suffix_min = None
+        self._prefix_max = None
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'rb') as index_file:
+                if index_file.readline() != _INDEX_MAGIC:
+                    return
+                header = json.loads(index_file.readline())
+                for name, typecode in (('times', 'd'), ('offsets', 'Q'), ('levels', 'B'), ('loggers', 'H')):
+                    values = array(typecode)
+                    values.fromfile(index_file, header['count'])
+                    setattr(self, name, values)
+        except (OSError, ValueError, EOFError, KeyError):
+            self._reset()
+            return
+        self.inode = header['inode']
+        self.size = header['size']
+        self.logger_names = header['loggers']
+        self._logger_ids = {name: i for i, name in enumerate(self.logger_names)}
+
+    def save(self):
+        header = {'inode': self.inode, 'size': self.size, 'count': len(self.offsets), 'loggers': self.logger_names}
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as index_file:
+            index_file.write(_INDEX_MAGIC)
+            index_file.write(json.dumps(header).encode() + b'\n')
+            for values in (self.times, self.offsets, self.levels, self.loggers):
+                values.tofile(index_file)
+        os.replace(tmp_path, self.index_path)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def update(self, save: bool = True) -> int:
+        """Indexes the records appended since the last update. Returns the number of new records"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if self.compressed:
+            # Compressed files don't grow. Sizes and offsets are of the uncompressed data
+            if stat.st_ino == self.inode and self.size:
+                return 0
+            self._reset(inode=stat.st_ino)
+        else:
+            if stat.st_ino != self.inode or stat.st_size < self.size:
+                # Replaced (rotated) or truncated file
+                self._reset(inode=stat.st_ino)
+            if stat.st_size == self.size:
+                return 0
+        count = len(self.offsets)
+        with open_log(self.path) as log_file:
+            self._index(log_file, self.size)
+        self._suffix_min = self._prefix_max = None
+        if save:
+            self.save()
+        return len(self.offsets) - count
+
+    def _index(self, log_file, offset):
+        log_file.seek(offset)
+        times = {}  # Parsed time strings: records of the same second share it
+        for line in log_file:
+            if not line.endswith(b'\n'):
+                break  # Incomplete last line: index it when it's complete
+            entry = self._parse(line, times)
+            if entry is not None:
+                timestamp, levelname, logger = entry
+                logger_id = self._logger_ids.get(logger)
+                if logger_id is None:
+                    logger_id = self._logger_ids[logger] = len(self.logger_names)
+                    self.logger_names.append(logger)
+                self.times.append(timestamp)
+                self.offsets.append(offset)
+                self.levels.append(min(level_number(levelname), 255))
+                self.loggers.append(logger_id)
+            # Lines which don't start a record are continuation lines of the previous record
+            offset += len(line)
+        self.size = offset
+
+    @staticmethod
+    def _parse(line, times):
+        """(timestamp, levelname, logger) of the record first line or None"""
+        match = _TEXT_RECORD.match(line)
+        if match:
+            time_string, logger, levelname = match.groups()
+            time_format = _TEXT_TIME_FORMAT
+            logger = logger.decode('utf-8', 'replace')
+        else:
+            match = _JSON_RECORD.match(line)
+            if not match:
+                return None
+            time_string, levelname, logger = match.groups()
+            time_format = _JSON_TIME_FORMAT
+            logger = json.loads(logger)
+        timestamp = times.get(time_string)
+        if timestamp is None:
+            try:
+                timestamp = datetime.strptime(time_string.decode('ascii'), time_format).timestamp()
+            except ValueError:
+                return None
+            times[time_string] = timestamp
+        return timestamp, levelname.decode('ascii'), logger
+
+    def _bounds(self, start, end):
+        """Range of the record numbers which might be within [start, end] (records are not strictly ordered)"""
+        if self._prefix_max is None:
+            prefix_max, suffix_min = array('d', self.times), array('d', self.times)
+            for i in range(1, len(prefix_max)):
+                if prefix_max[i] < prefix_max[i - 1]:
+                    prefix_max[i] = prefix_max[i - 1]
+            for i in range(len(suffix_min) - 2, -1, -1):
+                if suffix_min[i] > suffix_min[i + 1]:
+                    suffix_min[i] = suffix_min[i + 1]
+            self._prefix_max, self._suffix_min = prefix_max, suffix_min
+        first = 0 if start is None else bisect.bisect_left(self._prefix_max, start)
+        last = len(self.times) if end is None else bisect.bisect_right(self._suffix_min, end)
+        return first, last
+
+    def select(self, start=None, end=None, level=None, logger=None):
+        """Record numbers in [start, end] (datetime or epoch seconds) at level >= <level> of <logger>"""
+        start, end = to_timestamp(start), to_timestamp(end)
+        min_level = level_number(level)
+        logger_id = None
+        if logger is not None:
+            logger_id = self._logger_ids.get(logger)
+            if logger_id is None:
+                return []
+        first, last = self._bounds(start, end)
+        times, levels, loggers = self.times, self.levels, self.loggers
+        return [i for i in range(first, last)
+                if (start is None or times[i] >= start) and (end is None or times[i] <= end)
+                and levels[i] >= min_level and (logger_id is None or loggers[i] == logger_id)]
+
+    def query(self, start=None, end=None, level=None, logger=None, update: bool = True):
+        """Yields the matching Record-s, reading them from the log file through mmap"""
+        if update:
+            self.update()
+        selected = self.select(start, end, level, logger)
+        if not selected:
+            return
+        if self.compressed:
+            # Forward seeks only: the selected records are in the file order
+            with open_log(self.path) as log_file:
+                for i in selected:
+                    end_offset = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+                    log_file.seek(self.offsets[i])
+                    yield self._record(i, log_file.read(end_offset - self.offsets[i]))
+            return
+        with open(self.path, 'rb') as log_file:
+            with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for i in selected:
+                    end_offset = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+                    yield self._record(i, data[self.offsets[i]:end_offset])
+
+    def _record(self, i, raw):
+        raw = raw.rstrip(b'\n')
+        message = _message(raw)
+        return Record(datetime.fromtimestamp(self.times[i]), logging.getLevelName(self.levels[i]),
+                      self.logger_names[self.loggers[i]], message, raw.decode('utf-8', 'replace'),
+                      self.path, self.offsets[i])
+
+
+def log_files(path: str, logger: str = None) -> list:
+    """
+    Log files of the directory (or [path] for a file), oldest first: rotated "<name>.log.<date>" files,
+    then the current "<name>.log". logger: only the files of the logger (file name is the lower-cased logger name)
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for name in os.listdir(path):
+        if name.endswith(INDEX_SUFFIX) or name.endswith('.tmp') or '.log' not in name:
+            continue
+        base, _, rotation = name.partition('.log')
+        if logger is not None and base != logger.lower():
+            continue
+        # Current file sorts after its rotated files
+        files.append(((base, rotation.lstrip('.') or '~'), os.path.join(path, name)))
+    return [file_path for _, file_path in sorted(files)]
+
+
+def query(path: str, start=None, end=None, level=None, logger: str = None):
+    """
+    Yields records between <start> and <end> at level >= <level> of the <logger> from the log directory
+    (or file) <path>. Indexes of the files are created or updated as needed.
+    """
+    for file_path in log_files(path, logger):
+        yield from LogIndex(file_path).query(start, end, level, logger)
+
+
+class LogFollower(object):
+    """
+    Tails a log file across the rotations: yields the Record-s appended to it (one by one, bounded memory).
+
+    When the file is rotated (the path gets a new inode), the old file is read to its end through the open
+    descriptor before the new one is followed, so no records are lost or repeated. A truncated file is
+    followed from its start. A record ends at the first line of the next one (or at the end of the data
+    written so far: handlers write whole records).
+
+    checkpoint: {'inode', 'offset'} after the last yielded record. Resuming from it after a rotation reads
+    the rest of the rotated file first (while it's still uncompressed in the directory of the log file).
+
+    Parameters:
+        source: L logger (its log_file_name) or the log file path
+        checkpoint: checkpoint dict to resume from. Default: the end of the file (or its start: from_start=True)
+        checkpoint_file: resume from the checkpoint saved in the file (if any). The checkpoint is saved there
+                         whenever the follower waits for new records (all the yielded ones are processed)
+                         and when the iteration stops
+        from_start: follow from the start of the file instead of its end (without checkpoint)
+        poll_interval: seconds between the checks for new records
+        idle_timeout: stop after so many seconds without new data. None - follow forever
+        chunk_size: bytes read at once
+        max_record_bytes: longer records are truncated
+    """
+
+    def __init__(self, source, checkpoint: dict = None, checkpoint_file: str = None, from_start: bool = False,
+                 poll_interval: float = 0.25, idle_timeout: float = None, chunk_size: int = 1 << 16,
+                 max_record_bytes: int = 1 << 20):
+        path = source if isinstance(source, (str, os.PathLike)) else source.log_file_name
+        if not path:
+            raise ValueError(f"{source!r} doesn't write a log file")
+        if checkpoint is None and checkpoint_file is not None:
+            checkpoint = self.load_checkpoint(checkpoint_file)
+        self.path = os.fspath(path)
+        self.checkpoint_file = checkpoint_file
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.chunk_size = chunk_size
+        self.max_record_bytes = max_record_bytes
+        self._start = checkpoint
+        self._file = None
+        self._file_path = None
+        self._inode = None
+        self._position = 0  # File offset of the buffer start
+        self._buffer = b''  # Incomplete last line
+        self._pending = None  # [offset, lines, size, end offset] of the record being collected
+        self._consumed = checkpoint['offset'] if checkpoint else 0  # End offset of the last yielded record
+        self._times = {}
+        self._saved = None
+
+    @property
+    def checkpoint(self) -> dict:
+        """Position after the last yielded record"""
+        return {'path': self.path, 'inode': self._inode, 'offset': self._consumed}
+
+    def save_checkpoint(self, checkpoint_file: str):
+        tmp_path = f"{checkpoint_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as output:
+            json.dump(self.checkpoint, output)
+        os.replace(tmp_path, checkpoint_file)
+
+    @staticmethod
+    def load_checkpoint(checkpoint_file: str):
+        """Saved checkpoint or None"""
+        try:
+            with open(checkpoint_file) as checkpoint:
+                return json.load(checkpoint)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self, path, offset=None):
+        """Follows the file from the offset. FileNotFoundError: the current file is kept"""
+        new_file = open(path, 'rb')
+        self.close()
+        self._file = new_file
+        self._file_path = path
+        stat = os.fstat(self._file.fileno())
+        if offset is None or offset > stat.st_size:
+            offset = stat.st_size if offset is None else 0
+        self._file.seek(offset)
+        self._inode = stat.st_ino
+        self._position = self._consumed = offset
+        self._buffer = b''
+        self._pending = None
+
+    def _open_start(self) -> bool:
+        """Opens the file to start from. False if it doesn't exist yet"""
+        checkpoint, self._start = self._start, None
+        if checkpoint:
+            for file_path in [self.path] + log_files(os.path.dirname(self.path) or '.')[::-1]:
+                if is_compressed(file_path):
+                    continue
+                try:
+                    if os.stat(file_path).st_ino == checkpoint.get('inode'):
+                        self._open(file_path, checkpoint.get('offset', 0))
+                        return True
+                except OSError:
+                    continue
+            self.from_start = True  # Rotated and compressed (or removed) since the checkpoint
+        try:
+            self._open(self.path, 0 if self.from_start else None)
+        except FileNotFoundError:
+            self.from_start = True  # Created later: all its records are new
+            return False
+        return True
+
+    def _rotated(self) -> bool:
+        """True if the path is a new file. A truncated file is followed from the start"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # Renamed, the new file is not created yet
+        if stat.st_ino != self._inode:
+            return True
+        if stat.st_size < self._position + len(self._buffer):
+            try:
+                self._open(self.path, 0)
+            except FileNotFoundError:
+                pass  # Removed since the stat
+        return False
+
+    def _feed(self, data):
+        buffer = self._buffer + data if self._buffer else data
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            yield from self._line(self._position + start, buffer[start:end + 1])
+            start = end + 1
+        self._position += start
+        self._buffer = buffer[start:]
+        if len(self._buffer) > self.max_record_bytes:
+            # Line without the end: bounded memory
+            yield from self._line(self._position, self._buffer)
+            self._position += len(self._buffer)
+            self._buffer = b''
+
+    def _line(self, offset, line):
+        if _TEXT_RECORD.match(line) or _JSON_RECORD.match(line):
+            yield from self._flush()
+            self._pending = [offset, [line], len(line), offset + len(line)]
+        elif self._pending is not None:
+            # Continuation line of the record
+            pending = self._pending
+            if pending[2] < self.max_record_bytes:
+                pending[1].append(line)
+                pending[2] += len(line)
+            pending[3] = offset + len(line)
+        else:
+            self._pending = [offset, [line], len(line), offset + len(line)]
+
+    def _flush(self):
+        """Yields the collected record"""
+        if self._pending is None:
+            return
+        offset, lines, _, end = self._pending
+        self._pending = None
+        if len(self._times) > 4096:
+            self._times.clear()
+        entry = LogIndex._parse(lines[0], self._times)
+        raw = b''.join(lines).rstrip(b'\n')
+        if entry is None:
+            timestamp, levelname, logger = None, None, None
+        else:
+            timestamp, levelname, logger = entry
+        self._consumed = end
+        yield Record(datetime.fromtimestamp(timestamp) if timestamp is not None else None, levelname, logger,
+                     _message(raw), raw.decode('utf-8', 'replace'), self._file_path, offset)
+
+    def _drain(self):
+        """Reads the open file to its end"""
+        while True:
+            data = self._file.read(self.chunk_size)
+            if not data:
+                break
+            yield from self._feed(data)
+        if self._buffer:
+            yield from self._line(self._position, self._buffer)
+            self._position += len(self._buffer)
+            self._buffer = b''
+        yield from self._flush()
+
+    def __iter__(self):
+        idle_since = time.monotonic()
+        try:
+            while self._file is None:
+                if self._open_start():
+                    break
+                if self.idle_timeout is not None and time.monotonic() - idle_since >= self.idle_timeout:
+                    return
+                time.sleep(self.poll_interval)
+            while True:
+                data = self._file.read(self.chunk_size)
+                if data:
+                    idle_since = time.monotonic()
+                    yield from self._feed(data)
+                    continue
+                yield from self._flush()  # Records are written whole: the last one is complete
+                if self._file_path != self.path or self._rotated():
+                    yield from self._drain()  # Written before the rotation
+                    try:
+                        self._open(self.path, 0)
+                        continue
+                    except FileNotFoundError:
+                        pass  # The new file is not created yet: wait for it
+                self._save()
+                if self.idle_timeout is not None and time.monotonic() - idle_since >= self.idle_timeout:
+                    return
+                time.sleep(self.poll_interval)
+        finally:
+            self._save()
+            self.close()
+
+    def _save(self):
+        if self.checkpoint_file is None or self._inode is None:
+            return
+        checkpoint = self.checkpoint
+        if checkpoint != self._saved:
+            self.save_checkpoint(self.checkpoint_file)
+            self._saved = checkpoint
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def follow(source, **kwargs):
+    """
+    Yields the records appended to the log file of the L logger (or the log file path) as they are written,
+    across the rotations. See LogFollower for the parameters (e.g. checkpoint_file to resume after a restart).
+    """
+    yield from LogFollower(source, **kwargs)
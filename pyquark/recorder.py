@@ -0,0 +1,92 @@
+"""
+Flight recorder of the L loggers: the last DEBUG records which were not logged (debug=False), kept in memory
+and written to the log file when an error is logged, so the error comes with the context that led to it.
+
+Recording is an append of (timestamp, colour, site, message) to a preallocated ring: the prefix of the call site
+is not formatted until the records are dumped. Lazy messages (callables) are called when they are recorded,
+so the dump shows the state at the time of each record, not at the time of the error.
+"""
+import itertools
+import logging
+import time
+
+
+class FlightRecorder(object):
+    """
+    Fixed-size ring buffer of the records of one logger.
+
+    Parameters:
+        size: records kept (the older ones are overwritten)
+        dump_last: records written by dump(). Default: size
+    """
+    __slots__ = ('size', 'dump_last', 'dumped', '_ring', '_counter', '_end', '_start')
+
+    def __init__(self, size: int = 1000, dump_last: int = None):
+        if size < 1:
+            raise ValueError(f"size must be >= 1, got {size!r}")
+        self.size = int(size)
+        self.dump_last = min(self.size, int(dump_last or self.size))
+        self.dumped = 0  # Records written by the dumps
+        self._ring = [None] * self.size
+        self._counter = itertools.count(1)  # next() is atomic: concurrent appends get their own slots
+        self._end = 0  # Number of the last record (1, 2, ...)
+        self._start = 0  # Number of the last dumped (or cleared) record
+
+    def append(self, colour, site, str_line):
+        """site: anything the prefix is rendered from by dump(). A callable str_line is called now"""
+        if callable(str_line):
+            try:
+                str_line = str_line()
+            except Exception as exc:
+                str_line = f"<lazy message failed: {exc!r}>"
+        end = self._end = next(self._counter)
+        self._ring[end % self.size] = (time.time(), colour, site, str_line)
+
+    def __len__(self):
+        return min(self._end - self._start, self.size)
+
+    def records(self, last: int = None) -> list:
+        """Up to <last> recorded (timestamp, colour, site, message) tuples, oldest first"""
+        end = self._end
+        start = max(self._start, end - min(last or self.size, self.size))
+        ring, size = self._ring, self.size
+        return [entry for entry in (ring[index % size] for index in range(start + 1, end + 1)) if entry is not None]
+
+    def clear(self):
+        self._start = self._end
+
+    def dump(self, log, handler: logging.Handler, prefix_of=str) -> int:
+        """
+        Writes the last dump_last records through the handler (regardless of its level) as DEBUG records
+        of the L logger <log>, then clears the recorder. prefix_of(site) renders the prefix.
+        Returns the number of written records
+        """
+        entries = self.records(self.dump_last)
+        self.clear()
+        if not entries:
+            return 0
+        logger = log.logger
+        text = f"flight recorder: last {len(entries)} DEBUG records"
+        header = logger.makeRecord(logger.name, logging.DEBUG, "(unknown file)", 0, text, None, None)
+        header.colour = 'blue'
+        header.prefix = ''
+        header.text = text
+        header.owner = log._owner
+        header.decorator = log.decorator
+        header.fields = {'flight_recorder': len(entries)}
+        handler.handle(header)
+        for created, colour, site, str_line in entries:
+            prefix = prefix_of(site)
+            record = logger.makeRecord(logger.name, logging.DEBUG, "(unknown file)", 0,
+                                       log.FORMAT.format(prefix, str_line), None, None)
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+            record.colour = colour
+            record.prefix = prefix
+            record.owner = log._owner
+            record.decorator = log.decorator
+            record.text = str_line
+            record.fields = {'flight_recorder': True}
+            handler.handle(record)
+        self.dumped += len(entries)
+        return len(entries)
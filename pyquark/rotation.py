@@ -0,0 +1,137 @@
+"""
+Rotating log files with the background compression of the rotated ones.
+Separate from pyquark.handlers: logging.handlers is imported only when a file logger is created.
+"""
+import atexit
+import logging.handlers
+import os
+import queue
+import threading
+
+from pyquark.handlers import COMPRESSION_SUFFIXES, INDEX_SUFFIX, LevelWatch
+
+
+class Compressor(object):
+    """
+    Background thread compressing the rotated log files (gzip or lzma).
+    The file is compressed into "<dest>.tmp", renamed to <dest> and the source is removed.
+    Pending files are compressed at exit.
+    """
+    _shared = None
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.errors = 0
+        atexit.register(self.join)
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = Compressor()
+        return cls._shared
+
+    def submit(self, source: str, dest: str, method: str = 'gzip'):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='pyquark.compressor', daemon=True)
+                self._thread.start()
+        self._queue.put((source, dest, method))
+
+    def join(self):
+        """Waits until the submitted files are compressed"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            source, dest, method = self._queue.get()
+            try:
+                self.compress(source, dest, method)
+                self.compressed += 1
+            except Exception:
+                self.errors += 1
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def compress(source: str, dest: str, method: str = 'gzip'):
+        import shutil
+        if method == 'gzip':
+            import gzip
+            opener = gzip.open
+        else:
+            import lzma
+            opener = lzma.open
+        tmp_path = dest + '.tmp'
+        with open(source, 'rb') as source_file, opener(tmp_path, 'wb') as dest_file:
+            shutil.copyfileobj(source_file, dest_file, 1 << 20)
+        os.replace(tmp_path, dest)
+        os.remove(source)
+        if os.path.exists(source + INDEX_SUFFIX):
+            os.remove(source + INDEX_SUFFIX)
+
+
+class RotatingFileHandler(LevelWatch, logging.handlers.TimedRotatingFileHandler):
+    """
+    TimedRotatingFileHandler with optional compression of the rotated files.
+    compress: 'gzip' or 'lzma'. The rollover only renames the file, the Compressor thread compresses it.
+    Rotated files left uncompressed (e.g. by a killed process) are compressed when the handler is created.
+    """
+
+    def __init__(self, *args, compress: str = None, **kwargs):
+        if compress is not None and compress not in COMPRESSION_SUFFIXES:
+            raise ValueError(f'Unknown compression "{compress}". One of {tuple(COMPRESSION_SUFFIXES)} is expected.')
+        super(RotatingFileHandler, self).__init__(*args, **kwargs)
+        self.compress = compress
+        if compress:
+            self.namer = self._compressed_name
+            self.rotator = self._rotate
+            self._compress_leftovers()
+
+    def _compressed_name(self, default_name):
+        return default_name + COMPRESSION_SUFFIXES[self.compress]
+
+    def _rotate(self, source, dest):
+        plain_dest = dest[:-len(COMPRESSION_SUFFIXES[self.compress])]
+        os.replace(source, plain_dest)
+        Compressor.shared().submit(plain_dest, dest, self.compress)
+
+    def _rotated_files(self):
+        """Rotated files of this handler: [(path, suffix)]. Skips sidecar indexes and temporary files"""
+        dir_name, base_name = os.path.split(self.baseFilename)
+        prefix = base_name + '.'
+        result = []
+        for file_name in os.listdir(dir_name):
+            if not file_name.startswith(prefix) or file_name.endswith((INDEX_SUFFIX, '.tmp')):
+                continue
+            suffix = file_name[len(prefix):]
+            if self.extMatch.match(suffix):
+                result.append((os.path.join(dir_name, file_name), suffix))
+        return result
+
+    def _compress_leftovers(self):
+        suffixes = tuple(COMPRESSION_SUFFIXES.values())
+        for path, suffix in self._rotated_files():
+            if not suffix.endswith(suffixes) and not os.path.exists(self._compressed_name(path)):
+                Compressor.shared().submit(path, self._compressed_name(path), self.compress)
+
+    def getFilesToDelete(self):
+        """Expired rotated files with their sidecar indexes, and the indexes left without their log file"""
+        result = sorted(path for path, _ in self._rotated_files())
+        expired = result[:len(result) - self.backupCount] if len(result) >= self.backupCount else []
+        suffixes = tuple(COMPRESSION_SUFFIXES.values())
+        sidecars = set()
+        for path in expired:
+            sidecars.add(path + INDEX_SUFFIX)
+            if path.endswith(suffixes):
+                sidecars.add(path.rsplit('.', 1)[0] + INDEX_SUFFIX)  # Index of the file before compression
+        dir_name, base_name = os.path.split(self.baseFilename)
+        for file_name in os.listdir(dir_name):
+            if file_name.startswith(base_name + '.') and file_name.endswith(INDEX_SUFFIX):
+                log_path = os.path.join(dir_name, file_name[:-len(INDEX_SUFFIX)])
+                if not any(os.path.exists(log_path + suffix) for suffix in ('',) + suffixes):
+                    sidecars.add(log_path + INDEX_SUFFIX)
+        return expired + sorted(path for path in sidecars if os.path.exists(path))
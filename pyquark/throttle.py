@@ -0,0 +1,213 @@
+"""
+Log storm protection of the L loggers.
+
+RateLimiter: token bucket per call site (or per message template). Records over the limit are dropped
+before their message is evaluated and their prefix is computed; the number of the dropped ones is logged
+as "last message repeated N times" when the site is allowed again or by the summary timer.
+
+Sampler: keeps 1 of every N DEBUG records, with N raised while the records per second exceed a target.
+The decision is made before the message is evaluated and the prefix is computed.
+"""
+import atexit
+import math
+import threading
+import time
+
+SITE = 'site'
+TEMPLATE = 'template'
+
+
+class _Bucket(object):
+    __slots__ = ('tokens', 'stamp', 'suppressed', 'site', 'prefix', 'level', 'colour', 'log')
+
+    def __init__(self, tokens, stamp, site, prefix=''):
+        self.tokens = tokens
+        self.stamp = stamp
+        self.suppressed = 0
+        self.site = site  # Code object of the call site or the message template
+        self.prefix = prefix  # Call-site prefix of the first record of the key (for the summaries)
+        self.level = None
+        self.colour = None
+        self.log = None
+
+
+class RateLimiter(object):
+    """
+    Token buckets of one logger.
+
+    Parameters:
+        rate: records per second allowed per key
+        burst: bucket size (records allowed at once). Default: max(1, rate)
+        by: 'site' - key is the calling line, 'template' - key is the message string
+            (or the code of a lazy message callable)
+        interval: seconds between the "repeated N times" summaries of the suppressed records
+        max_keys: max number of buckets. A new key above it drops the idle buckets, then the least recently
+                  used ones, down to 3/4 of max_keys
+    """
+
+    def __init__(self, rate: float, burst: int = None, by: str = SITE, interval: float = 5.0,
+                 max_keys: int = 10000):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate!r}")
+        if by not in (SITE, TEMPLATE):
+            raise ValueError(f"by must be {SITE!r} or {TEMPLATE!r}, got {by!r}")
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.by = by
+        self.interval = interval
+        self.max_keys = max_keys
+        self.suppressed = 0  # Total number of the suppressed records
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stop = threading.Event()
+
+    def allow(self, key, site, level, colour, log) -> bool:
+        """Takes a token of the key. False: the record is suppressed (and counted for the summary)"""
+        now = time.monotonic()
+        evicted = None
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    evicted = self._evict(now)
+                bucket = self._buckets[key] = _Bucket(self.burst, now, site, log._limit_prefix())
+            tokens = min(self.burst, bucket.tokens + (now - bucket.stamp) * self.rate)
+            bucket.stamp = now
+            if tokens < 1:
+                bucket.tokens = tokens
+                bucket.suppressed += 1
+                bucket.level, bucket.colour, bucket.log = level, colour, log
+                self.suppressed += 1
+                if self._timer is None:
+                    self._start_timer()
+                allowed, repeated = False, 0
+            else:
+                bucket.tokens = tokens - 1
+                allowed, repeated, bucket.suppressed = True, bucket.suppressed, 0
+        if evicted:
+            for dropped, count in evicted:
+                self._summary(dropped, count)
+        if repeated:
+            self._summary(bucket, repeated)
+        return allowed
+
+    def _evict(self, now) -> list:
+        """
+        Drops the idle buckets (refilled, nothing suppressed), then the least recently used ones, down to 3/4
+        of max_keys. Called under the lock. Returns (bucket, suppressed) of the dropped buckets to summarize
+        """
+        buckets = self._buckets
+        refill = self.burst / self.rate
+        for key in [key for key, bucket in buckets.items() if not bucket.suppressed and now - bucket.stamp >= refill]:
+            del buckets[key]
+        keep = self.max_keys * 3 // 4
+        summaries = []
+        if len(buckets) > keep:
+            for key in sorted(buckets, key=lambda key: buckets[key].stamp)[:len(buckets) - keep]:
+                bucket = buckets.pop(key)
+                if bucket.suppressed:
+                    summaries.append((bucket, bucket.suppressed))
+        return summaries
+
+    @staticmethod
+    def _summary(bucket, repeated):
+        site = bucket.site
+        text = f"last message repeated {repeated} times"
+        if isinstance(site, str):
+            text = f"{text}: {site[:80]}"
+        try:
+            bucket.log._log(bucket.level, bucket.colour, bucket.prefix, text)
+        except Exception:
+            pass  # Logger was removed
+
+    def flush(self):
+        """Logs the summaries of the suppressed records and drops the idle buckets"""
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for bucket in self._buckets.values():
+                if bucket.suppressed:
+                    summaries.append((bucket, bucket.suppressed))
+                    bucket.suppressed = 0
+            refill = self.burst / self.rate
+            self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket.stamp < refill}
+        for bucket, repeated in summaries:
+            self._summary(bucket, repeated)
+
+    def _start_timer(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                self.flush()
+
+        self._timer = threading.Thread(target=run, name='pyquark.throttle.summary', daemon=True)
+        self._timer.start()
+        atexit.register(self.flush)
+
+    def stop(self):
+        """Logs the pending summaries and stops the summary timer"""
+        self._stop.set()
+        if self._timer is not None:
+            atexit.unregister(self.flush)  # Don't keep the limiter (and its loggers) alive
+        self.flush()
+
+
+class Sampler(object):
+    """
+    1-in-N sampling of the records of one logger.
+
+    Parameters:
+        every: keep 1 of every <every> records
+        target: adaptive mode: records per second to keep. When more records are logged, N is raised
+                for the next <window> seconds to max(every, ceil(rate / target))
+        window: seconds between the adaptive rate updates
+    Counters are updated under a lock: the sampler is shared by the threads logging through the logger.
+    """
+    __slots__ = ('base', 'every', 'target', 'window', 'seen', 'kept', '_count', '_window_start', '_window_seen',
+                 '_lock')
+
+    def __init__(self, every: int = 1, target: float = None, window: float = 1.0):
+        if every < 1:
+            raise ValueError(f"every must be >= 1, got {every!r}")
+        if target is not None and target <= 0:
+            raise ValueError(f"target must be positive, got {target!r}")
+        self.base = self.every = int(every)
+        self.target = target
+        self.window = window
+        self.seen = 0  # Records offered
+        self.kept = 0  # Records logged
+        self._count = 0
+        self._window_start = time.monotonic()
+        self._window_seen = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            self.seen += 1
+            if self.target is not None:
+                self._window_seen += 1
+                now = time.monotonic()
+                elapsed = now - self._window_start
+                if elapsed >= self.window:
+                    rate = self._window_seen / elapsed
+                    self.every = max(self.base, math.ceil(rate / self.target))
+                    self._window_start, self._window_seen = now, 0
+            self._count += 1
+            if self._count < self.every:
+                return False
+            self._count = 0
+            self.kept += 1
+            return True
+
+    @property
+    def dropped(self) -> int:
+        """Records sampled out"""
+        with self._lock:
+            return self.seen - self.kept
+
+    def stats(self) -> dict:
+        """Counters for the dashboards: logged counts scale back by seen / kept"""
+        with self._lock:
+            seen, kept = self.seen, self.kept
+        return {'seen': seen, 'kept': kept, 'dropped': seen - kept, 'every': self.every,
+                'scale': seen / kept if kept else 0.0}
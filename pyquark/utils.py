@@ -1,5 +1,7 @@
 import os
-import time
+import sys
+
+from pyquark.metrics import exec_time  # noqa: F401
 
 
 def get_parent_path(path, levels_up):
@@ -10,18 +12,6 @@ def get_parent_path(path, levels_up):
     return parent_path
 
 
-def exec_time(func):
-    """Apply as decorator to any method to measure its exec time"""
-    def wrapper(*args, **kwargs):
-        start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        end_time = time.perf_counter()
-        execution_time = end_time - start_time
-        print(f"Execution time of {func.__name__}: {execution_time:.6f} seconds")
-        return result
-    return wrapper
-
-
 def find_parent_path(path, target_folder, logger=None):
     # Find the parent path that contains the target folder
     current_path = path
@@ -54,45 +44,158 @@ def __init__(self, name):
     self._custom_objects = []  # Track custom objects with __destroy__ method
 
 
-def __destroy__(self, hard_destroy=False, calling_class=None):
+def _is_numpy(value):
+    return type(value).__module__.startswith('numpy') and hasattr(value, 'nbytes')
+
+
+class _Reclaimer(object):
+    """
+    Iterative traversal of __destroy__: walks the containers reachable from the destroyed object,
+    destroys the child objects and counts the memory.
+    Only the containers the object owns (its dict attributes, cleared as before) are cleared, others may still
+    be held elsewhere: with in_place=True all the reachable containers are cleared and memoryviews released.
+    Each object is visited once (shared objects and cycles); visited objects are kept alive until the end
+    of the traversal, so their ids are not reused.
     """
-    Frees up memory by clearing all instance attributes
+
+    def __init__(self, calling_class=None, in_place=False):
+        self.calling_class = calling_class
+        self.in_place = in_place
+        self.owned = set()  # ids of the containers cleared in place
+        self.seen = {}
+        self.stack = []
+        self.report = {'objects': 0, 'bytes': 0, 'buffer_bytes': 0, 'gc_collected': None, 'traced_delta': None}
+
+    def count(self, value) -> bool:
+        """Counts the value in the report. False if it was counted already"""
+        if id(value) in self.seen:
+            return False
+        self.seen[id(value)] = value
+        self.report['objects'] += 1
+        try:
+            self.report['bytes'] += sys.getsizeof(value)
+        except TypeError:
+            pass
+        return True
+
+    def visit(self, value) -> bool:
+        """Counts the value and queues it for the traversal. False if it was visited already"""
+        if not self.count(value):
+            return False
+        self.stack.append(value)
+        return True
+
+    def run(self):
+        stack = self.stack
+        while stack:
+            value = stack.pop()
+            owned = self.in_place or id(value) in self.owned
+            if isinstance(value, dict):
+                for item in value.values():
+                    self.visit(item)
+                if owned:
+                    value.clear()
+            elif isinstance(value, (list, set)):
+                for item in value:
+                    self.visit(item)
+                if owned:
+                    value.clear()
+            elif isinstance(value, (tuple, frozenset)):
+                for item in value:
+                    self.visit(item)
+            elif isinstance(value, memoryview):
+                self.release(value, owned)
+            elif _is_numpy(value):
+                if getattr(getattr(value, 'flags', None), 'owndata', True):
+                    self.report['buffer_bytes'] += value.nbytes  # Views don't own their buffers
+            elif getattr(value.__class__, '__destroy__', None) and type(value) != self.calling_class:
+                if value.__class__.__destroy__ is __destroy__:
+                    self.destroy_attributes(value)  # Without recursion
+                else:
+                    value.__destroy__()
+
+    def release(self, view, owned):
+        try:
+            nbytes = view.nbytes
+            if owned:
+                view.release()
+            self.report['buffer_bytes'] += nbytes
+        except (BufferError, ValueError):
+            pass  # Exported or released already
+
+    def destroy_attributes(self, obj, hard_destroy=False):
+        attrs = list(getattr(obj, '__dict__', ()))
+
+        if hard_destroy:
+            # Remove all attributes regardless of their type
+            for attr_name in attrs:
+                self.count(getattr(obj, attr_name, None))
+                delattr(obj, attr_name)
+            return
+
+        # Handle specific attribute types differently. Contents are traversed by run()
+        for attr_name in attrs:
+
+            if (attr_value := getattr(obj, attr_name, None)) is None:
+                continue
+
+            self.visit(attr_value)
+            # Handle by type
+            if isinstance(attr_value, dict):
+                self.owned.add(id(attr_value))  # Cleared in place by run()
+            elif isinstance(attr_value, (list, tuple)):
+                # Set to empty of the same type
+                setattr(obj, attr_name, [] if isinstance(attr_value, list) else ())
+            elif getattr(attr_value.__class__, '__destroy__', None) and type(attr_value) != self.calling_class:
+                # Objects with __destroy__ method are destroyed by run()
+                setattr(obj, attr_name, None)
+            elif _is_numpy(attr_value):
+                # This handles NumPy arrays specifically
+                delattr(obj, attr_name)
+            else:
+                # For simple types (and sets, memoryviews), just set to None
+                setattr(obj, attr_name, None)
+
+
+def __destroy__(self, hard_destroy=False, calling_class=None, collect=False, trace=False, in_place=False):
+    """
+    Frees up memory by clearing all instance attributes.
+    Nested containers (dicts, lists, tuples, sets) are traversed iteratively, child objects with __destroy__
+    are destroyed. Shared objects and cycles are visited once. Dict attributes are cleared, list and tuple
+    attributes are replaced with empty ones: containers the caller may still hold are left as they are.
 
     Args:
         hard_destroy (bool): If True, removes all attributes using delattr
                             regardless of their type
+        calling_class: objects of this class are not destroyed (e.g. back references to the owner)
+        collect (bool): run gc.collect() for each generation after the traversal
+        trace (bool): measure the traced memory delta (if tracemalloc is tracing)
+        in_place (bool): also clear every reachable list, dict and set and release the memoryviews,
+                         including the ones other objects still hold
+
+    Returns:
+        dict: 'objects' - number of the visited objects, 'bytes' - their sys.getsizeof() sum,
+              'buffer_bytes' - nbytes of the NumPy arrays (owning their data) and memoryviews,
+              'gc_collected' - objects collected per generation (collect=True),
+              'traced_delta' - bytes freed according to tracemalloc (trace=True)
     """
-    # Create a list of all attributes
-    attrs = list(self.__dict__.keys())
+    tracemalloc = None
+    if trace:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc = None
+    traced_before = tracemalloc.get_traced_memory()[0] if tracemalloc else 0
 
-    if hard_destroy:
-        # Get all attributes and delete them
-        for attr_name in attrs:
-            delattr(self, attr_name)
-        return
-
-    # Handle specific attribute types differently
-    for attr_name in attrs:
-
-        if (attr_value := getattr(self, attr_name, None)) is None:
-            continue
-
-        # Handle by type
-        if isinstance(attr_value, dict):
-            attr_value.clear()
-        elif isinstance(attr_value, (list, tuple)):
-            # Set to empty of the same type
-            if isinstance(attr_value, list):
-                setattr(self, attr_name, [])
-            else:
-                setattr(self, attr_name, ())
-        elif getattr(attr_value.__class__, '__destroy__', None) and type(attr_value) != calling_class:
-            # Call __destroy__ on objects that have that method
-            attr_value.__destroy__()
-            setattr(self, attr_name, None)
-        elif 'numpy' in str(type(attr_value).__module__):
-            # This handles NumPy arrays specifically
-            delattr(self, attr_name)
-        else:
-            # For simple types, just set to None
-            setattr(self, attr_name, None)
\ No newline at end of file
+    reclaimer = _Reclaimer(calling_class, in_place)
+    reclaimer.seen[id(self)] = self
+    reclaimer.destroy_attributes(self, hard_destroy)
+    reclaimer.run()
+    report = reclaimer.report
+    del reclaimer  # Visited objects are freed here
+
+    if collect:
+        import gc
+        report['gc_collected'] = [gc.collect(generation) for generation in range(3)]
+    if tracemalloc:
+        report['traced_delta'] = traced_before - tracemalloc.get_traced_memory()[0]
+    return report